@@ -1,10 +1,38 @@
+import os
 import time
-import board
-import neopixel
-import adafruit_dht
+
+if os.environ.get("CPS_VIRTUAL"):
+    # headless run: frames go to a capture file and the DHT22 is simulated (see virtual_strip.py)
+    from virtual_strip import board, neopixel, adafruit_dht, clock
+else:
+    import board
+    import neopixel
+    import adafruit_dht
+    clock = None
+
+from render import StripRenderer
+from sensors import SensorScheduler
+
+# --- MODIFY THIS ---
+RENDER_FPS = 10          # LED refreshes per second, whatever the sensor is doing
+SENSOR_INTERVAL = 2.0    # seconds between reads of each DHT22 (2 s is the fastest the sensor allows)
+SENSOR_WORKERS = 2       # threads doing the blocking reads; about one per 4 sensors is plenty
+# DHT22 sensors as (terrace index, GPIO pin); add more, several per terrace if you like,
+# e.g. [(0, board.D4), (2, board.D5), (4, board.D6)]
+SENSORS = [(0, board.D4)]  # Using GPIO4 for DHT22
+
+# Humidity (%) at which 2, 3, 4 and 5 terraces light up
+HUMIDITY_THRESHOLDS = [40, 60, 75, 85]
+HUMIDITY_HYSTERESIS = 2.0  # width of the band around each threshold where the level holds (% RH)
+TINT_STEP = 16             # temperature tint is rounded to steps of this much green (0-255)
 
 # --- SENSOR SETUP ---
-dhtDevice = adafruit_dht.DHT22(board.D4)  # Using GPIO4 for DHT22
+sensors = SensorScheduler([(terrace, adafruit_dht.DHT22(pin)) for terrace, pin in SENSORS],
+                          workers=SENSOR_WORKERS, interval=SENSOR_INTERVAL,
+                          clock=clock.time if clock else time.monotonic)  # reads on worker threads
+# On the virtual clock (CPS_VIRTUAL_SLEEP) time only moves when this loop sleeps, so the
+# sensors are read from the loop itself instead
+POLL_SENSORS = clock is not None and clock.virtual
 
 # --- LED SETUP ---
 pixels = [
@@ -15,12 +43,40 @@ pixels = [
     neopixel.NeoPixel(board.D19, 30, brightness=0.8, auto_write=False)
 ]
 
+renderer = StripRenderer(pixels)
+
 # --- HELPER FUNCTIONS ---
 def fill_all(color):
     for strip in pixels:
         strip.fill(color)
         strip.show()
 
+def humidity_level(humidity, current=None):
+    """Terraces to light (1-5); near a threshold the current level holds until humidity clears the band."""
+    if current is None:
+        return 1 + sum(humidity >= t for t in HUMIDITY_THRESHOLDS)
+    half = HUMIDITY_HYSTERESIS / 2
+    level = current
+    while level <= len(HUMIDITY_THRESHOLDS) and humidity >= HUMIDITY_THRESHOLDS[level - 1] + half:
+        level += 1
+    while level > 1 and humidity < HUMIDITY_THRESHOLDS[level - 2] - half:
+        level -= 1
+    return level
+
+def tint_color(temperature, current=None):
+    """Warmer → less green, quantized to TINT_STEP; the shown tint holds until it is a full step off."""
+    green = 255 - temperature * 3
+    if current is not None and abs(green - current[1]) <= TINT_STEP:
+        return current
+    green = min(255, max(0, int(round(green / TINT_STEP) * TINT_STEP)))
+    return (0, green, 255)
+
+def render_terraces(level, color):
+    """Lit terraces in color, the rest off; only strips that change are written."""
+    for i in range(len(pixels)):
+        renderer.fill(i, color if i < level else (0, 0, 0))
+    renderer.commit()
+
 def water_flow(level):
     """Light up terraces based on 'level' (0–5)."""
     fill_all((0,0,0))  # turn everything off first
@@ -30,38 +86,48 @@ def water_flow(level):
 
 # --- MAIN LOOP ---
 try:
+    if not POLL_SENSORS:
+        sensors.start()
+    last_reading = None
+    level, color = None, None
+    skipped = 0  # strip writes a refill on every read would have sent for an unchanged display
     while True:
-        try:
-            temperature = dhtDevice.temperature
-            humidity = dhtDevice.humidity
-            print(f"Temp: {temperature:.1f}°C, Humidity: {humidity:.1f}%")
-
-            # Simple logic: higher humidity → more terraces lit
-            if humidity < 40:
-                level = 1
-            elif humidity < 60:
-                level = 2
-            elif humidity < 75:
-                level = 3
-            elif humidity < 85:
-                level = 4
-            else:
-                level = 5
-
-            # Optionally: use temperature to tint color
-            color = (0, int(255 - (temperature * 3)), 255)
-            for i in range(level):
-                pixels[i].fill(color)
-                pixels[i].show()
-
-            print(f"Lighting up {level} terraces\n")
-            time.sleep(5)
-
-        except RuntimeError as e:
-            # DHT sensors sometimes time out; just retry
-            print("Sensor read error:", e)
-            time.sleep(2)
+        if POLL_SENSORS:
+            sensors.poll()
+        table = sensors.table(len(pixels))  # never waits for a sensor
+        reading = sensors.combined(table)   # mean over terraces with fresh readings
+        if reading is None or reading.time == last_reading:
+            # nothing new to show
+            time.sleep(1.0 / RENDER_FPS)
+            continue
+        last_reading = reading.time
+        temperature = reading.temperature
+        humidity = reading.humidity
+
+        # Higher humidity → more terraces lit; temperature tints the color
+        new_level = humidity_level(humidity, level)
+        new_color = tint_color(temperature, color)
+        if (new_level, new_color) != (level, color):
+            level, color = new_level, new_color
+            render_terraces(level, color)
+        else:
+            skipped += level
+
+        print(f"Temp: {temperature:.1f}°C, Humidity: {humidity:.1f}% "
+              f"({reading.samples} terraces, {sensors.failures} failed reads)")
+        for row in table:
+            if row is not None:
+                stale = " STALE" if row.stale else ""
+                print(f"  Terrace {row.terrace + 1}: {row.temperature:.1f}°C, {row.humidity:.1f}% "
+                      f"({row.sensors} sensors, {row.age:.1f}s old){stale}")
+        for sampler in sensors.samplers:
+            if sampler.last_error and sampler.consecutive_failures:
+                print("Sensor read error:", sampler.last_error)
+        print(f"Lighting up {level} terraces (strip writes: {renderer.writes} sent, "
+              f"{skipped + renderer.avoided} redundant avoided)\n")
+        time.sleep(1.0 / RENDER_FPS)
 
 except KeyboardInterrupt:
     print("Shutting down...")
+    sensors.stop()
     fill_all((0, 0, 0))
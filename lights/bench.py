@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# bench.py
+# Benchmark suite: what a frame costs for the strip layouts used in this repo.
+# - PigpioMulti.show() runs against fake_pigpio, which records pulses and counts the bytes
+#   the pigpio client would send to the daemon.
+# - The neopixel scripts run on the virtual backend (virtual_strip.py) with virtual sleeps.
+# Output is one JSON object per line so results can be kept and compared between runs:
+#     python3 bench.py > results.jsonl
+#     python3 bench.py --frames 5 --no-scripts
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import fake_pigpio
+from virtual_strip import read_capture
+from water_sim import TerraceSimulator, Topology
+
+pm = fake_pigpio.load_pigpio_multi()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# GPIO pins in the order the scripts use them (board.D18, D12, D13, D19, D21)
+PINS = [18, 12, 13, 19, 21]
+
+# Strip lengths per layout in the tree
+LAYOUTS = {
+    "case1": [150, 150, 150, 100, 100],     # case1.py / test.py
+    "fivestrips": [30, 30, 30, 30, 30],     # FiveStrips.py
+    "pigpio": [50, 50, 100, 100, 100],      # pigpio.py __main__
+}
+SCALES = [1, 4]
+
+# Scripts that run forever under virtual sleeps; stopped after --seconds of virtual time
+SCRIPTS = ["case1.py", "test.py", "blue.py", "FiveStrips.py"]
+
+def frame_patterns(multi, rng):
+    """Generators that change the pixel buffer before each show()."""
+    def fill(i):
+        # a new solid color every frame: always a cache miss
+        for s in range(len(multi.pins)):
+            multi.fill_strip(s, (i % 256, 0, 255 - i % 256))
+
+    def random_pixels(i):
+        for s, count in enumerate(multi.counts):
+            multi.set_pixel(s, slice(0, count), rng.integers(0, 256, size=(count, 3)))
+
+    def blink(i):
+        # case1.py style: one level toggles, the others stay put
+        level = (i // 2) % len(multi.pins)
+        multi.set_pixel(level, slice(0, multi.counts[level] // 2), (0, 0, 139) if i % 2 else (0, 0, 0))
+
+    def static(i):
+        pass
+
+    return {"fill": fill, "random": random_pixels, "blink": blink, "static": static}
+
+def bench_show(layout, counts, mode, frames, seed=0):
+    results = []
+    strips = list(zip(PINS, counts))
+    for pattern in ("fill", "random", "blink", "static"):
+        pi = fake_pigpio.pi(capture=False)
+        multi = pm.PigpioMulti(pi, strips, brightness=0.8, fragments=(mode == "fragments"))
+        rng = np.random.default_rng(seed)
+        # show() reports send errors with print(); count them instead of mixing them into the output
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            for s in range(len(strips)):
+                multi.fill_strip(s, (0, 0, 255))
+            multi.show()
+        change = frame_patterns(multi, rng)[pattern]
+
+        # encode only: full-frame pulse build, no cache, no daemon
+        encode = 0.0
+        for i in range(frames):
+            change(i)
+            start = time.perf_counter()
+            multi._build_pulses(*multi._encode_masks())
+            encode += time.perf_counter() - start
+
+        bytes_before, pulses_before = pi.bytes_sent, multi.pulses_sent
+        sent_before = multi.frames_sent
+        errors_before = log.getvalue().count("Error")
+        elapsed = 0.0
+        with contextlib.redirect_stdout(log):
+            for i in range(frames):
+                change(i)
+                start = time.perf_counter()
+                multi.show()
+                elapsed += time.perf_counter() - start
+        multi._cleanup()
+        sent = multi.frames_sent - sent_before
+        errors = log.getvalue().count("Error") - errors_before
+        # a layout that fails to send has no frame rate; skipped frames (static) are fine
+        failed = errors > 0 or (sent == 0 and pattern != "static")
+
+        results.append({
+            "bench": "show",
+            "layout": layout,
+            "strips": counts,
+            "mode": mode,
+            "pattern": pattern,
+            "frames": frames,
+            "frames_sent": sent,
+            "errors": errors,
+            "encode_ms": 1000 * encode / frames,
+            "show_ms": None if failed else 1000 * elapsed / frames,
+            "pulses_per_frame": (multi.pulses_sent - pulses_before) / frames,
+            "bytes_per_frame": (pi.bytes_sent - bytes_before) / frames,
+            "fps": frames / elapsed if elapsed and not failed else None,
+            "cache_hits": multi.cache_hits,
+            "cache_misses": multi.cache_misses,
+        })
+    return results
+
+def bench_clamp(calls=100000):
+    rng = random.Random(0)
+    colors = [(rng.randint(-50, 300), rng.randint(-50, 300), rng.randint(-50, 300)) for _ in range(1000)]
+    start = time.perf_counter()
+    for i in range(calls):
+        pm.clamp_color(colors[i % 1000])
+    per_call = (time.perf_counter() - start) / calls
+    block = np.array(colors)
+    start = time.perf_counter()
+    for _ in range(100):
+        pm.clamp_colors(block)
+    per_pixel = (time.perf_counter() - start) / (100 * len(block))
+    return [{"bench": "clamp_color", "us_per_call": 1e6 * per_call},
+            {"bench": "clamp_colors", "us_per_pixel": 1e6 * per_pixel}]
+
+def bench_water(scenarios, terraces, steps=20):
+    """One TerraceSimulator step over a (scenarios, terraces) batch."""
+    sim = TerraceSimulator(np.full(terraces, 200.0), np.full(terraces, 2.0), np.full(terraces, 150.0),
+                           10.0, scenarios=scenarios)
+    start = time.perf_counter()
+    sim.step(1.0, steps)
+    per_step = (time.perf_counter() - start) / steps
+    return {"bench": "water_step", "scenarios": scenarios, "terraces": terraces,
+            "step_ms": 1000 * per_step, "ns_per_cell": 1e9 * per_step / (scenarios * terraces)}
+
+def bench_water_tree(terraces, scenarios=1, steps=20):
+    """Branching network: every terrace drains into (k - 1) // 2, springs on the leaves."""
+    leaves = range(terraces // 2, terraces)
+    topology = Topology(terraces, [(k, (k - 1) // 2) for k in range(1, terraces)],
+                        springs={k: 1.0 / len(leaves) for k in leaves})
+    sim = TerraceSimulator(np.full(terraces, 200.0), np.full(terraces, 2.0), np.full(terraces, 150.0),
+                           float(len(leaves)), scenarios=scenarios, topology=topology)
+    start = time.perf_counter()
+    sim.step(1.0, steps)
+    per_step = (time.perf_counter() - start) / steps
+    return {"bench": "water_step_tree", "scenarios": scenarios, "terraces": terraces,
+            "depth": len(topology.groups), "step_ms": 1000 * per_step,
+            "ns_per_cell": 1e9 * per_step / (scenarios * terraces)}
+
+def bench_script(script, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        capture_path = os.path.join(tmp, "capture.bin")
+        env = dict(os.environ, CPS_VIRTUAL="1", CPS_VIRTUAL_SLEEP="1",
+                   CPS_VIRTUAL_SECONDS=str(seconds), CPS_CAPTURE=capture_path)
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.join(HERE, script)], env=env, cwd=tmp,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall = time.perf_counter() - start
+        frames = len(read_capture(capture_path)) if os.path.exists(capture_path) else 0
+    return {
+        "bench": "script",
+        "script": script,
+        "returncode": proc.returncode,
+        "virtual_seconds": seconds,
+        "wall_s": wall,
+        "frames": frames,
+        "frames_per_wall_s": frames / wall if wall else None,
+        "speedup": seconds / wall if wall else None,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frame cost benchmarks (JSON lines on stdout)")
+    parser.add_argument("--frames", type=int, default=20, help="frames per show() benchmark")
+    parser.add_argument("--seconds", type=float, default=60, help="virtual seconds per script run")
+    parser.add_argument("--no-scripts", action="store_true", help="skip the virtual-backend script runs")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    def emit(result):
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    for layout, counts in LAYOUTS.items():
+        for scale in SCALES:
+            name = layout if scale == 1 else f"{layout}x{scale}"
+            for mode in ("frame", "fragments"):
+                for result in bench_show(name, [c * scale for c in counts], mode, args.frames):
+                    emit(result)
+    for result in bench_clamp():
+        emit(result)
+    for scenarios, terraces in ((1, 5), (10000, 5), (1, 2000), (2000, 2000)):
+        emit(bench_water(scenarios, terraces))
+    for scenarios, terraces in ((1, 4095), (100, 4095)):
+        emit(bench_water_tree(terraces, scenarios))
+    if not args.no_scripts:
+        for script in SCRIPTS:
+            emit(bench_script(script, args.seconds))
+    if args.output:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# bench_pigpio.py
+# Times PigpioMulti frame encoding against the original per-bit Python loops,
+# and checks that every strip still receives exactly its bits.
+# Runs anywhere: pigpio is replaced by fake_pigpio, so no daemon or Pi is needed.
+
+import random
+import time
+
+import fake_pigpio
+
+pm = fake_pigpio.load_pigpio_multi()
+
+# Strip layout used by case1.py (board.D18, D12, D13, D19, D21)
+CASE1_STRIPS = [(18, 150), (12, 150), (13, 150), (19, 100), (21, 100)]
+
+def legacy_pulses(multi):
+    """The original show() encoder: bitstreams built bit by bit, then masks per bit index."""
+    max_pixels = max(multi.counts)
+    bitstreams = []
+    for s_idx in range(len(multi.pins)):
+        bs = []
+        for i in range(max_pixels):
+            if i < multi.counts[s_idx]:
+                r, g, b = multi.pixels[s_idx][i]
+                r = int(r * multi.brightness)
+                g = int(g * multi.brightness)
+                b = int(b * multi.brightness)
+                grb = (g & 0xFF, r & 0xFF, b & 0xFF)
+            else:
+                grb = (0, 0, 0)
+            for byte in grb:
+                for bit in range(7, -1, -1):
+                    bs.append(1 if (byte >> bit) & 1 else 0)
+        bitstreams.append(bs)
+
+    total_bits = len(bitstreams[0])
+    pulses = []
+    gpio_masks = [1 << pin for pin in multi.pins]
+    for bit_index in range(total_bits):
+        want1_mask = 0
+        for i_pin, mask in enumerate(gpio_masks):
+            if bitstreams[i_pin][bit_index]:
+                want1_mask |= mask
+        if want1_mask:
+            pulses.append(pm.pigpio.pulse(want1_mask, 0, pm.T0H_US))
+            if pm.T1H_US > pm.T0H_US:
+                pulses.append(pm.pigpio.pulse(0, 0, pm.T1H_US - pm.T0H_US))
+            pulses.append(pm.pigpio.pulse(0, want1_mask, pm.T1L_US))
+        else:
+            pulses.append(pm.pigpio.pulse(0, 0, pm.T0H_US + pm.T0L_US))
+    return pulses
+
+def decode_bits(pulses, pin):
+    """Replay pulses on one GPIO and read back its bits from the high times."""
+    mask = 1 << pin
+    bits = []
+    level = 0
+    high_for = 0
+    for p in pulses:
+        if p.gpio_on & mask and not level:
+            level, high_for = 1, 0
+        if p.gpio_off & mask and level:
+            level = 0
+            bits.append(1 if high_for >= pm.T1H_US else 0)
+        if level:
+            high_for += p.delay
+    return bits
+
+def expected_bits(multi, s_idx):
+    """MSB-first GRB bits the strip should receive for the current pixels and brightness."""
+    bits = []
+    for r, g, b in multi.pixels[s_idx][:multi.counts[s_idx]].tolist():
+        for byte in (int(g * multi.brightness), int(r * multi.brightness), int(b * multi.brightness)):
+            bits.extend((byte >> bit) & 1 for bit in range(7, -1, -1))
+    return bits
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(repeat=5):
+    multi = pm.PigpioMulti(fake_pigpio.pi(), CASE1_STRIPS, brightness=0.8)
+    rng = random.Random(0)
+    for s_idx, count in enumerate(multi.counts):
+        for i in range(count):
+            multi.set_pixel(s_idx, i, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+
+    new = lambda: multi._build_pulses(*multi._encode_masks())
+    pulses = new()
+    for s_idx, pin in enumerate(multi.pins):
+        if decode_bits(pulses, pin) != expected_bits(multi, s_idx):
+            raise SystemExit(f"Strip on GPIO {pin} would not receive its pixels")
+
+    t_legacy = best_of(lambda: legacy_pulses(multi), repeat)
+    t_new = best_of(new, repeat)
+    slots = max(multi.counts) * 24
+    print(f"Layout: {CASE1_STRIPS} ({slots} bit slots)")
+    print(f"Original encoder:   {t_legacy * 1000:8.2f} ms, {len(legacy_pulses(multi))} pulses")
+    print(f"Vectorized encoder: {t_new * 1000:8.2f} ms, {len(pulses)} pulses")
+    print(f"Speedup: {t_legacy / t_new:.1f}x")
+
+if __name__ == "__main__":
+    main()
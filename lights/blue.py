@@ -1,6 +1,12 @@
+import os
 import time
-import board
-import neopixel
+
+if os.environ.get("CPS_VIRTUAL"):
+    # headless run: frames go to a capture file instead of the strips (see virtual_strip.py)
+    from virtual_strip import board, neopixel
+else:
+    import board
+    import neopixel
 
 # 5 terraces (bottom → top)
 print("Initializing LED strips...")
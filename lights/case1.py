@@ -1,6 +1,18 @@
+import os
 import time
-import board
-import neopixel
+
+if os.environ.get("CPS_VIRTUAL"):
+    # headless run: frames go to a capture file instead of the strips (see virtual_strip.py)
+    from virtual_strip import board, neopixel
+else:
+    import board
+    import neopixel
+
+from forecast import forecast_sim, format_seconds
+from render import StripRenderer
+from scenario import StatusRecorder, TickRecorder, load_scenario, status_name
+from telemetry import Telemetry
+from water_sim import SimulationRunner, TerraceSimulator
 
 # 5 terraces (bottom → top)
 print("Initializing LED strips...")
@@ -18,6 +30,9 @@ except Exception as e:
     print(f"Error initializing LED strips: {e}")
     exit(1)
 
+# Only strips whose pixels changed are written and shown (see render.py)
+renderer = StripRenderer(pixels)
+
 # Color definitions
 OFF = (0, 0, 0)
 YELLOW = (255, 255, 0)      # Drought <50%
@@ -37,7 +52,6 @@ COLOR_NAMES = {
 # Water system parameters (MODIFY THESE FOR DIFFERENT SCENARIOS)
 NORMAL_SPRING_RATE = 3.0    # Normal water input (L/s)
 HEAVY_RAIN_RATE = 10.0      # Heavy rain water input (L/s) - MODIFY THIS
-current_spring_rate = NORMAL_SPRING_RATE
 
 # Blockage parameters
 LEVEL_4_NORMAL_FLOW = 2.0   # Normal Level 4 flow rate
@@ -49,16 +63,67 @@ water_capacities = [400, 300, 250, 200, 150]  # Level 1 to Level 5
 # Flow rates for each level in L/s (Level 4 will be modified during blockage)
 flow_rates = [4.0, 3.0, 2.5, LEVEL_4_NORMAL_FLOW, 1.5]  # Level 1 to Level 5 (L/s)
 
-# Current water levels in litres (start at 50% capacity)
-current_water_levels = [200.0, 150.0, 125.0, 100.0, 75.0]  # Level 1 to Level 5
+# Starting water levels in litres (start at 50% capacity)
+initial_water_levels = [200.0, 150.0, 125.0, 100.0, 75.0]  # Level 1 to Level 5
+
+# Scenario timeline - MODIFY THIS (or set CPS_SCENARIO): a JSON file of timed events (see scenario.py)
+# that sets heavy rain / Level 4 blockage and the rates instead of the manual triggers,
+# and ends the run after its duration. CPS_STATUS_RECORD=path records the status as JSON lines.
+# CPS_TIMESERIES=dir appends every tick (levels, rates, flags, LED colors) to a column store for
+# long-run analysis: colstore.query() / colstore.downsample() read it back. A directory that already
+# holds ticks is not overwritten: use a new one per run (or CPS_TIMESERIES_OVERWRITE=1 to replace it).
+SCENARIO_FILE = os.environ.get("CPS_SCENARIO") or None
+STATUS_RECORD = os.environ.get("CPS_STATUS_RECORD") or None
+TIMESERIES = os.environ.get("CPS_TIMESERIES") or None
+TIMESERIES_OVERWRITE = bool(os.environ.get("CPS_TIMESERIES_OVERWRITE"))
+
+scenario = None
+recorder = StatusRecorder(STATUS_RECORD) if STATUS_RECORD else None
+ticks = TickRecorder(TIMESERIES, overwrite=TIMESERIES_OVERWRITE, meta={"scenario": SCENARIO_FILE}) if TIMESERIES else None
+if SCENARIO_FILE:
+    scenario = load_scenario(SCENARIO_FILE, defaults={
+        "normal_spring_rate": NORMAL_SPRING_RATE,
+        "heavy_rain_rate": HEAVY_RAIN_RATE,
+        "level_4_normal_flow": LEVEL_4_NORMAL_FLOW,
+        "level_4_blocked_flow": LEVEL_4_BLOCKED_FLOW,
+        "capacities": water_capacities,
+        "flow_rates": flow_rates,
+        "initial_levels": initial_water_levels,
+    })
+    water_capacities = scenario.parameters["capacities"]
+
+# Water model state (levels, flow rates, spring rate) lives in the simulator; one scenario here
+if scenario is not None:
+    sim = scenario.make_simulator()
+else:
+    sim = TerraceSimulator(water_capacities, flow_rates, initial_water_levels, NORMAL_SPRING_RATE)
+
+# Fast-forward mode - MODIFY THIS (or set CPS_SIM_SPEED)
+# None: one simulated second per blink cycle (about 5 real seconds), as before
+# A number: the water model runs on its own clock at that many simulated seconds per real second
+#           (60 = one simulated hour per minute) and the LEDs show its latest state
+# "max": the water model runs as fast as it can
+SIMULATION_SPEED = os.environ.get("CPS_SIM_SPEED") or None
+RENDER_FPS = 10             # LED frames per second in fast-forward mode
+
+# Telemetry - MODIFY THIS (or set the environment variables): every blink and status is recorded as
+# an event (see telemetry.py) instead of printed.
+# CPS_TELEMETRY=path      log the events (JSON lines, or raw records if the path ends in .bin)
+# CPS_CONSOLE_EVERY=N     print one line with every level's latest event at most every N seconds,
+#                         followed by the latest status table, forecast and strip-write counters
+# Without CPS_CONSOLE_EVERY the run is quiet after its start-up banner.
+TELEMETRY_LOG = os.environ.get("CPS_TELEMETRY") or None
+CONSOLE_EVERY = float(os.environ["CPS_CONSOLE_EVERY"]) if os.environ.get("CPS_CONSOLE_EVERY") else None
+telemetry = Telemetry(TELEMETRY_LOG, console_every=CONSOLE_EVERY, color_names=COLOR_NAMES).start()
 
 # Simulation control flags
 level_4_blocked = False     # Set to True to trigger Level 4 blockage - MANUAL TRIGGER
 heavy_rain_active = False   # Set to True to trigger heavy rain - MANUAL TRIGGER
 
-def get_color_for_level(level_index):
+def get_color_for_level(level_index, state=None):
     """Get LED color based on water level percentage"""
-    water_percentage = (current_water_levels[level_index] / water_capacities[level_index]) * 100
+    state = state or sim
+    water_percentage = (state.levels[0, level_index] / water_capacities[level_index]) * 100
     
     if water_percentage < 50:
         return YELLOW
@@ -73,87 +138,97 @@ def get_color_name(color_tuple):
     """Get color name from RGB tuple"""
     return COLOR_NAMES.get(color_tuple, "UNKNOWN")
 
-def display_current_colors():
-    """Display current LED colors for all levels"""
-    print("\n--- Current LED Colors ---")
+def display_current_colors(state=None):
+    """Current LED colors for all levels, as text to print or note"""
+    lines = []
+    state = state or sim
+    conditions = conditions_at(state)
+    lines.append("\n--- Current LED Colors ---")
     for i in range(5):
         level_num = i + 1
-        current_color = get_color_for_level(i)
+        current_color = get_color_for_level(i, state)
         color_name = get_color_name(current_color)
-        water_pct = (current_water_levels[i] / water_capacities[i]) * 100
+        water_pct = (state.levels[0, i] / water_capacities[i]) * 100
         
         # Add special status indicators
         status_info = ""
-        if i == 3 and level_4_blocked:  # Level 4 blocked
+        if i == 3 and conditions["level_4_blocked"]:  # Level 4 blocked
             status_info = " [BLOCKED]"
         
-        print(f"Level {level_num}: {color_name} LED ({water_pct:.1f}%){status_info}")
-    print("-------------------------")
+        lines.append(f"Level {level_num}: {color_name} LED ({water_pct:.1f}%){status_info}")
+    lines.append("-------------------------")
+    return "\n".join(lines)
 
-def update_water_system():
-    """Update water levels with blockage and heavy rain scenarios"""
-    global current_water_levels, current_spring_rate, flow_rates
-    
-    # Time step (1 second per update cycle)
-    time_step = 1.0
+def conditions_at(state=None):
+    """Heavy rain and blockage flags in effect for a state: the scenario's at its time, or the manual triggers"""
+    state = state or sim
+    if scenario is not None:
+        return scenario.conditions_at(state.time)
+    return {"heavy_rain": heavy_rain_active, "level_4_blocked": level_4_blocked}
+
+def apply_conditions(sim):
+    """Set the spring and Level 4 flow rates from the heavy rain and blockage flags; returns the flags"""
+    if scenario is not None:
+        # the timeline sets the flags and all rates for the simulated time
+        return scenario.apply(sim)
+    conditions = conditions_at(sim)
     
     # Update spring rate based on heavy rain status
-    if heavy_rain_active:
-        current_spring_rate = HEAVY_RAIN_RATE
+    if conditions["heavy_rain"]:
+        sim.spring_rate[:] = HEAVY_RAIN_RATE
     else:
-        current_spring_rate = NORMAL_SPRING_RATE
+        sim.spring_rate[:] = NORMAL_SPRING_RATE
     
     # Update Level 4 flow rate based on blockage status
-    if level_4_blocked:
-        flow_rates[3] = LEVEL_4_BLOCKED_FLOW  # Level 4 (index 3) is blocked
+    if conditions["level_4_blocked"]:
+        sim.flow_rates[:, 3] = LEVEL_4_BLOCKED_FLOW  # Level 4 (index 3) is blocked
     else:
-        flow_rates[3] = LEVEL_4_NORMAL_FLOW   # Level 4 normal flow
-    
-    # Add water to Level 5 from water spring
-    water_input = current_spring_rate * time_step
-    current_water_levels[4] += water_input
+        sim.flow_rates[:, 3] = LEVEL_4_NORMAL_FLOW   # Level 4 normal flow
+    return conditions
+
+def before_step(sim):
+    """Apply the current conditions (and record the status) before the model advances"""
+    conditions = apply_conditions(sim)
+    if recorder is not None:
+        recorder.record(sim, conditions)
+    if ticks is not None:
+        ticks.record(sim, conditions, [get_color_for_level(i, sim) for i in range(5)])
+
+def update_water_system():
+    """Update water levels with blockage and heavy rain scenarios"""
+    # Time step (1 second per update cycle)
+    time_step = 1.0
     
-    # Water flows from higher levels to lower levels when overflowing
-    # Process from Level 5 down to Level 2
-    for i in range(4, 0, -1):  # Level 5 (index 4) down to Level 2 (index 1)
-        if current_water_levels[i] > water_capacities[i]:
-            # Calculate overflow
-            overflow = current_water_levels[i] - water_capacities[i]
-            
-            # Calculate actual transfer rate (limited by level's flow rate)
-            actual_transfer = min(overflow, flow_rates[i] * time_step)
-            
-            # Transfer water to next lower level
-            current_water_levels[i] -= actual_transfer
-            current_water_levels[i-1] += actual_transfer
+    before_step(sim)
     
-    # Level 1 outflow (water disappears from system)
-    if current_water_levels[0] > 0:
-        outflow = min(current_water_levels[0], flow_rates[0] * time_step)
-        current_water_levels[0] -= outflow
-
-def display_water_status():
-    """Display current water status with blockage and rain indicators"""
-    print("\n" + "="*70)
-    print("FLOOD SIMULATION - WATER SYSTEM STATUS")
-    print("="*70)
+    # Spring input, overflow cascade from Level 5 down to Level 2, Level 1 outflow
+    sim.step(time_step)
+
+def display_water_status(state=None):
+    """Current water status with blockage and rain indicators, as text to print or note"""
+    lines = []
+    state = state or sim
+    lines.append("\n" + "="*70)
+    lines.append("FLOOD SIMULATION - WATER SYSTEM STATUS")
+    lines.append("="*70)
     
     # Display current conditions
-    rain_status = "HEAVY RAIN" if heavy_rain_active else "NORMAL"
-    blockage_status = "BLOCKED" if level_4_blocked else "NORMAL"
+    conditions = conditions_at(state)
+    rain_status = "HEAVY RAIN" if conditions["heavy_rain"] else "NORMAL"
+    blockage_status = "BLOCKED" if conditions["level_4_blocked"] else "NORMAL"
     
-    print(f"Weather: {rain_status} | Water Input: {current_spring_rate} L/s")
-    print(f"Level 4 Flow: {blockage_status} ({flow_rates[3]} L/s)")
-    print("-"*70)
+    lines.append(f"Weather: {rain_status} | Water Input: {state.spring_rate[0]} L/s")
+    lines.append(f"Level 4 Flow: {blockage_status} ({state.flow_rates[0, 3]} L/s)")
+    lines.append("-"*70)
     
     flood_levels = 0  # Count levels in flood state
     
     for i in range(5):
         level_num = i + 1
-        water_pct = (current_water_levels[i] / water_capacities[i]) * 100
+        water_pct = (state.levels[0, i] / water_capacities[i]) * 100
         capacity = water_capacities[i]
-        current = current_water_levels[i]
-        flow_rate = flow_rates[i]
+        current = state.levels[0, i]
+        flow_rate = state.flow_rates[0, i]
         
         if water_pct < 50:
             status = "DROUGHT"
@@ -166,110 +241,187 @@ def display_water_status():
             flood_levels += 1
         
         # Add blockage indicator for Level 4
-        blockage_indicator = " [BLOCKED]" if level_4_blocked and i == 3 else ""
+        blockage_indicator = " [BLOCKED]" if conditions["level_4_blocked"] and i == 3 else ""
         
-        print(f"Level {level_num}: {current:6.1f}L/{capacity}L ({water_pct:5.1f}%) | Flow: {flow_rate} L/s | {status}{blockage_indicator}")
+        lines.append(f"Level {level_num}: {current:6.1f}L/{capacity}L ({water_pct:5.1f}%) | Flow: {flow_rate} L/s | {status}{blockage_indicator}")
     
     # Calculate system throughput
-    total_input = current_spring_rate
-    total_output = min(current_water_levels[0], flow_rates[0]) if current_water_levels[0] > 0 else 0
-    print("-"*70)
-    print(f"System Input: {total_input} L/s | System Output: {total_output:.1f} L/s")
+    total_input = state.spring_rate[0]
+    total_output = min(state.levels[0, 0], state.flow_rates[0, 0]) if state.levels[0, 0] > 0 else 0
+    lines.append("-"*70)
+    lines.append(f"System Input: {total_input} L/s | System Output: {total_output:.1f} L/s")
     
     if flood_levels > 0:
-        print(f"⚠️  FLOOD ALERT: {flood_levels} levels in flood state! ⚠️")
+        lines.append(f"⚠️  FLOOD ALERT: {flood_levels} levels in flood state! ⚠️")
     
-    print("="*70)
+    lines.append("="*70)
+    return "\n".join(lines)
+
+def display_forecast(state=None):
+    """When each level reaches 50/75/100% and floods if the current settings hold, as text"""
+    lines = []
+    state = (state or sim).copy()
+    apply_conditions(state)  # forecast with the flags as they are now
+    forecast = forecast_sim(state)
+    lines.append("--- Forecast (current settings, simulated time) ---")
+    for i in range(5):
+        times = forecast.time_to[i]
+        lines.append(f"Level {i + 1}: 50% {format_seconds(times[50])} | 75% {format_seconds(times[75])} | "
+                     f"100% {format_seconds(times[100])} | flood {format_seconds(forecast.flood_at[i])}")
+    lines.append(f"Time to flood: {format_seconds(forecast.time_to_flood)}")
+    lines.append("-" * 51)
+    return "\n".join(lines)
+
+def record_level(kind, level_index, color, state=None):
+    """Telemetry event for one level (cheap: no formatting or I/O here)"""
+    state = state or sim
+    water_pct = (state.levels[0, level_index] / water_capacities[level_index]) * 100
+    telemetry.record(kind, level_index, water_pct, color, status_name(water_pct),
+                     conditions_at(state)["level_4_blocked"] and level_index == 3, state.time)
 
 def blink_blocked_level(level_index, pixel_range):
     """Special red blinking for blocked level"""
     # Red ON
-    for i in range(pixel_range[0], pixel_range[1]):
-        pixels[level_index][i] = RED
-    pixels[level_index].show()
+    renderer.set_segment(level_index, pixel_range[0], pixel_range[1], RED)
+    renderer.commit()
     
-    print(f"Level {level_index + 1}: RED LED ON (blocked)")
+    record_level("blocked_on", level_index, RED)
     time.sleep(0.5)  # Red ON for 0.5 seconds
     
     # Turn OFF
-    for i in range(pixel_range[0], pixel_range[1]):
-        pixels[level_index][i] = OFF
-    pixels[level_index].show()
+    renderer.set_segment(level_index, pixel_range[0], pixel_range[1], OFF)
+    renderer.commit()
     
-    print(f"Level {level_index + 1}: LED OFF (blocked)")
+    record_level("blocked_off", level_index, OFF)
     time.sleep(0.5)  # OFF for 0.5 seconds
 
 def keep_other_levels_colored(current_level, level_ranges):
     """Keep all other levels at their water capacity colors while one level blinks"""
     for i in range(5):
         if i != current_level:  # Keep all other levels at capacity color
-            color = get_color_for_level(i)
-            color_name = get_color_name(color)
-            for j in range(level_ranges[i][0], level_ranges[i][1]):
-                pixels[i][j] = color
-            pixels[i].show()
-            print(f"Level {i + 1}: {color_name} LED (steady)")
+            color = level_colors[i]
+            renderer.set_segment(i, level_ranges[i][0], level_ranges[i][1], color)
+            record_level("steady", i, color)
+    # strips already showing their color are not written again
+    renderer.commit()
 
 def blink_level(level_index, pixel_range, level_ranges):
     """Blink a specific level with special handling for blocked Level 4"""
-    print(f"\n--- Blinking Level {level_index + 1} ---")
-    
     # Special red blinking for blocked Level 4
-    if level_index == 3 and level_4_blocked:  # Level 4 is index 3
-        print("⚠️  Level 4 BLOCKED - Red blinking!")
+    if level_index == 3 and conditions_at()["level_4_blocked"]:  # Level 4 is index 3
         keep_other_levels_colored(level_index, level_ranges)
         blink_blocked_level(level_index, pixel_range)
         return
     
     # Normal blinking for other levels
-    level_color = get_color_for_level(level_index)
-    color_name = get_color_name(level_color)
+    level_color = level_colors[level_index]
     
     # Ensure all other levels show their capacity colors
     keep_other_levels_colored(level_index, level_ranges)
     
     # Turn OFF the current level
-    for i in range(pixel_range[0], pixel_range[1]):
-        pixels[level_index][i] = OFF
-    pixels[level_index].show()
+    renderer.set_segment(level_index, pixel_range[0], pixel_range[1], OFF)
+    renderer.commit()
     
-    print(f"Level {level_index + 1}: LED OFF (blinking)")
+    record_level("blink_off", level_index, OFF)
     time.sleep(0.5)  # OFF for 0.5 seconds
     
     # Turn ON the current level with capacity color
-    for i in range(pixel_range[0], pixel_range[1]):
-        pixels[level_index][i] = level_color
-    pixels[level_index].show()
+    renderer.set_segment(level_index, pixel_range[0], pixel_range[1], level_color)
+    renderer.commit()
     
-    print(f"Level {level_index + 1}: {color_name} LED ON (blinking)")
+    record_level("blink_on", level_index, level_color)
     time.sleep(0.5)  # ON for 0.5 seconds
 
+def update_level_colors(state=None):
+    """Status band color of every level, computed once per simulation tick"""
+    level_colors[:] = [get_color_for_level(i, state) for i in range(5)]
+
+def display_render_counters(cycles):
+    """How many strip writes the renderer sent and skipped since the last report, as text"""
+    counters = renderer.take_counters()
+    return (f"LED strip writes (last {cycles} cycles): {counters['writes']} sent, "
+            f"{counters['avoided']} avoided (unchanged)")
+
+def report_status(state=None, cycles=0, header=None):
+    """Status table, LED colors, forecast and strip-write counters for the telemetry console view"""
+    if not telemetry.console_on:
+        return
+    parts = [header] if header else []
+    parts += [display_water_status(state), display_current_colors(state), display_forecast(state)]
+    if cycles:
+        parts.append(display_render_counters(cycles))
+    telemetry.note("status", "\n".join(parts))
+
+# Current status color of each level (see update_level_colors)
+level_colors = [OFF] * 5
+
+# Pixel ranges for each level [start, end]
+level_ranges = [
+    [0, 60],   # Level 1: pixels 0-59
+    [0, 40],   # Level 2: pixels 0-39
+    [0, 30],   # Level 3: pixels 0-29
+    [0, 79],   # Level 4: pixels 0-78
+    [0, 50]    # Level 5: pixels 0-49
+]
+
 def flowing_water_animation():
     """Water animation with flood scenario simulation"""
-    # Define pixel ranges for each level [start, end]
-    level_ranges = [
-        [0, 60],   # Level 1: pixels 0-59
-        [0, 40],   # Level 2: pixels 0-39
-        [0, 30],   # Level 3: pixels 0-29
-        [0, 79],   # Level 4: pixels 0-78
-        [0, 50]    # Level 5: pixels 0-49
-    ]
-    
     # Update water system
     update_water_system()
+    update_level_colors()
+    for i in range(5):
+        record_level("status", i, level_colors[i])
     
-    # Display status every 5 cycles
+    # Report status every 5 cycles
     cycle_count = getattr(flowing_water_animation, 'cycle_count', 0)
     flowing_water_animation.cycle_count = cycle_count + 1
     
     if cycle_count % 5 == 0:
-        display_water_status()
-        display_current_colors()
+        report_status(cycles=5 if cycle_count else 0)
     
     # Blink from Level 5 down to Level 1
     for level in range(4, -1, -1):  # 4,3,2,1,0 (Level 5 down to Level 1)
         blink_level(level, level_ranges[level], level_ranges)
 
+def fast_forward_animation(runner):
+    """Draw the latest water state at RENDER_FPS while the runner advances the model on its own clock"""
+    frame_time = 1.0 / RENDER_FPS
+    frame = 0
+    shown = [None] * 5
+    while runner.running:
+        state = runner.latest()
+        update_level_colors(state)
+        blocked = conditions_at(state)["level_4_blocked"]
+        # same pattern as blink_level: Level 5 down to Level 1, one second each, OFF then ON
+        elapsed = frame * frame_time
+        blinking = 4 - int(elapsed) % 5
+        blink_on = elapsed % 1.0 >= 0.5
+        
+        if frame % (5 * RENDER_FPS) == 0:
+            report_status(state, 5 if frame else 0,
+                          f"Simulated time: {state.time:.0f} s ({runner.steps} steps, speed: {SIMULATION_SPEED})")
+        
+        for i in range(5):
+            color = level_colors[i]
+            if i == blinking:
+                if i == 3 and blocked:
+                    color = RED
+                if not blink_on:
+                    color = OFF
+            renderer.set_segment(i, level_ranges[i][0], level_ranges[i][1], color)
+            if color != shown[i]:
+                shown[i] = color
+                if i != blinking:
+                    kind = "steady"
+                else:
+                    kind = ("blocked_" if i == 3 and blocked else "blink_") + ("on" if blink_on else "off")
+                record_level(kind, i, color, state)
+        renderer.commit()
+        
+        frame += 1
+        time.sleep(frame_time)
+
 # Initial setup
 print("Setting up flood simulation scenario...")
 print(f"Normal Spring Rate: {NORMAL_SPRING_RATE} L/s")
@@ -281,27 +433,57 @@ print("MANUAL TRIGGERS (Modify these variables):")
 print("level_4_blocked = False  # Set to True to block Level 4")
 print("heavy_rain_active = False  # Set to True for heavy rain")
 print("="*50)
+if scenario is not None:
+    print(f"Scenario: {scenario.name} ({scenario.duration:.0f} s, {len(scenario.events)} events) - triggers follow its timeline")
 
+update_level_colors()
 for i in range(5):
-    color = get_color_for_level(i)
-    pixels[i].fill(color)
-    pixels[i].show()
+    renderer.fill(i, level_colors[i])
+renderer.commit()
 
 time.sleep(3)
-display_water_status()
-display_current_colors()
+print(display_water_status())
+print(display_current_colors())
 
 print("\nStarting flood simulation...")
 print("Modify 'level_4_blocked' and 'heavy_rain_active' variables to trigger scenarios")
 print("Press Ctrl+C to stop")
 
+runner = None
+duration = scenario.duration if scenario is not None else None
 try:
-    while True:
-        flowing_water_animation()
+    if SIMULATION_SPEED is None:
+        while duration is None or sim.time < duration:
+            flowing_water_animation()
+    else:
+        speed = None if SIMULATION_SPEED == "max" else float(SIMULATION_SPEED)
+        runner = SimulationRunner(sim, dt=1.0, speed=speed, before_step=before_step, duration=duration).start()
+        fast_forward_animation(runner)
+    if runner is not None and runner.error is not None:
+        # the runner thread stopped early (its traceback is printed above)
+        print(f"\nSimulation stopped by an error: {runner.error!r}")
+    elif scenario is not None:
+        # the scenario's timeline is over
+        print(f"\nScenario '{scenario.name}' finished at {sim.time:.0f} s simulated time")
+        print(display_water_status())
+        print(display_current_colors())
 
 except KeyboardInterrupt:
     print("\nStopping flood simulation...")
+
+finally:
+    if runner is not None:
+        runner.stop()
+    if recorder is not None:
+        recorder.record(sim, conditions_at(sim))
+        recorder.close()
+    if ticks is not None:
+        ticks.close()
+        print(f"Time series: {ticks.store.rows} ticks -> {TIMESERIES}")
+    telemetry.close()
+    if TELEMETRY_LOG:
+        print(f"Telemetry: {telemetry.written} events -> {TELEMETRY_LOG} ({telemetry.dropped} dropped)")
     for strip in pixels:
         strip.fill(OFF)
         strip.show()
-    print("Flood simulation ended.")
\ No newline at end of file
+    print("Flood simulation ended.")
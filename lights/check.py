@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# check.py
+# Checks the optimized code paths against what they replace or approximate, so a later change
+# cannot break them silently. Runs anywhere: pigpio is replaced by fake_pigpio.
+#     python3 check.py
+# Exits with a message at the first mismatch.
+
+import time
+
+import numpy as np
+
+import fake_pigpio
+from forecast import THRESHOLDS, forecast_sim
+from water_sim import TerraceSimulator
+
+pm = fake_pigpio.load_pigpio_multi()
+
+class FrameLog:
+    """Stands in for the capture file of virtual_strip.py: keeps the last frame latched per pin."""
+    def __init__(self):
+        self.frames = {}
+
+    def append(self, t, strip, pin, brightness, pixels):
+        self.frames[pin] = pixels.copy()
+
+def decoding_pi(**limits):
+    """fake_pigpio.pi that decodes every transmitted pulse back into pixels."""
+    pi = fake_pigpio.pi(capture=False, **limits)
+    pi.decoder = fake_pigpio.WireDecoder(FrameLog(), time)
+    return pi
+
+def expected_pixels(multi, s):
+    """r,g,b the strip should show: the pixel buffer through the output LUT."""
+    return multi._frame_grb()[s, :multi.counts[s]][:, [1, 0, 2]]
+
+def check_streaming():
+    """Frames bigger than the control-block pool stream through it and arrive intact."""
+    for strips in ([(18, 600), (12, 600), (13, 600)], [(18, 1000), (12, 1000)], [(18, 3000)]):
+        pi = decoding_pi()
+        multi = pm.PigpioMulti(pi, strips, brightness=0.8)
+        rng = np.random.default_rng(0)
+        for _ in range(3):
+            for s, (_, count) in enumerate(strips):
+                multi.set_pixel(s, slice(0, count), rng.integers(0, 256, size=(count, 3)))
+            multi.show()
+            pi.wave_tx_busy()
+            for s, (pin, _) in enumerate(strips):
+                if not np.array_equal(pi.decoder.capture.frames[pin], expected_pixels(multi, s)):
+                    raise SystemExit(f"Streamed frame on {strips}: GPIO {pin} got the wrong pixels")
+        if multi.streamed_frames != 3 or multi.stream_underruns:
+            raise SystemExit(f"{strips}: {multi.streamed_frames} of 3 frames streamed, "
+                             f"{multi.stream_underruns} underruns")
+        multi._cleanup()
+        if pi.cbs_in_use():
+            raise SystemExit(f"{strips}: {pi.cbs_in_use()} control blocks still taken after cleanup")
+
+def check_wave_cache():
+    """
+    Cached frames and fragments share a small control-block pool: every frame still goes out,
+    and the pool PigpioMulti budgets with is the daemon's.
+    """
+    strips = [(18, 60), (12, 60), (13, 40)]
+    pi = decoding_pi(max_cbs=20000)
+    multi = pm.PigpioMulti(pi, strips, wave_cache_size=4, fragments=True)
+    rng = np.random.default_rng(1)
+    frames = [rng.integers(0, 256, size=(len(strips), 60, 3)) for _ in range(6)]
+    for i in range(60):
+        if i % 3:
+            # random pixels: too long for a chain, sent as frame waves
+            for s, (_, count) in enumerate(strips):
+                multi.set_pixel(s, slice(0, count), frames[i % len(frames)][s, :count])
+        else:
+            # solid fills: chained fragments, new colors need new fragment waves
+            for s in range(len(strips)):
+                multi.fill_strip(s, (i, 255 - i, 7 * s))
+        sent = multi.frames_sent
+        multi.show()
+        pi.wave_tx_busy()
+        if multi.frames_sent != sent + 1:
+            raise SystemExit(f"Frame {i} was not sent")
+        for s, (pin, _) in enumerate(strips):
+            if not np.array_equal(pi.decoder.capture.frames[pin], expected_pixels(multi, s)):
+                raise SystemExit(f"Frame {i}: GPIO {pin} got the wrong pixels")
+        if multi._pool_used() != pi.cbs_in_use():
+            raise SystemExit(f"Frame {i}: PigpioMulti counts {multi._pool_used()} control blocks "
+                             f"in use, pigpio {pi.cbs_in_use()}")
+    if not multi.cache_hits or not multi.chained_frames:
+        raise SystemExit("The wave cache check sent no cached or chained frames")
+    multi._cleanup()
+    if pi.cbs_in_use():
+        raise SystemExit(f"{pi.cbs_in_use()} control blocks still taken after cleanup")
+
+def check_fragment_chain():
+    """
+    Frames with more runs of identical LEDs than pigpio has loop counters still go out as a chain
+    (one strip: a byte per fragment), or fall back to a frame wave (several strips).
+    """
+    rng = np.random.default_rng(5)
+    for strips, chained in (([(18, 150)], True), ([(18, 60), (12, 60), (13, 60)], False)):
+        pi = decoding_pi()
+        multi = pm.PigpioMulti(pi, strips, fragments=True)
+        for runs in (10, 30, 60):
+            for s, (_, count) in enumerate(strips):
+                colors = rng.integers(0, 256, size=(runs, 3))
+                multi.set_pixel(s, slice(0, count), np.repeat(colors, -(-count // runs), axis=0)[:count])
+            sent, chains = multi.frames_sent, multi.chained_frames
+            multi.show()
+            pi.wave_tx_busy()
+            if multi.frames_sent != sent + 1:
+                raise SystemExit(f"{len(strips)} strip(s), {runs} runs: frame was not sent")
+            for s, (pin, _) in enumerate(strips):
+                if not np.array_equal(pi.decoder.capture.frames[pin], expected_pixels(multi, s)):
+                    raise SystemExit(f"{len(strips)} strip(s), {runs} runs: GPIO {pin} got the wrong pixels")
+            if chained and multi.chained_frames != chains + 1:
+                raise SystemExit(f"One strip, {runs} runs: frame was not chained")
+        multi._cleanup()
+
+def decode_pulses(on, off, delay, pins):
+    """Replay pulses on the pins: per pin, (start, high time) of every high pulse, and the total time."""
+    t = 0
+    rose = {}
+    highs = {pin: [] for pin in pins}
+    for gpio_on, gpio_off, us in zip(on.tolist(), off.tolist(), delay.tolist()):
+        for pin in pins:
+            if gpio_on >> pin & 1:
+                if pin in rose:
+                    raise SystemExit(f"GPIO {pin} set high twice at {t} us")
+                rose[pin] = t
+            if gpio_off >> pin & 1 and pin in rose:
+                start = rose.pop(pin)
+                highs[pin].append((start, t - start))
+        t += us
+    if rose:
+        raise SystemExit(f"GPIO {sorted(rose)} left high at the end of the frame")
+    return highs, t
+
+def check_encoder():
+    """
+    The merged parallel pulses of a (truncated) frame give every pin exactly its bits, one per
+    WS2812 slot, and nothing on pins with nothing to send.
+    """
+    pins = [18, 12, 13, 19, 21]
+    period = pm.T0H_US + pm.T0L_US
+    rng = np.random.default_rng(3)
+    frames = [rng.integers(0, 256, size=(5, 40, 3), dtype=np.uint8),
+              np.zeros((5, 40, 3), dtype=np.uint8),
+              np.full((5, 40, 3), 255, dtype=np.uint8),
+              np.repeat(rng.integers(0, 256, size=(5, 1, 3), dtype=np.uint8), 40, axis=1)]
+    for f, grb in enumerate(frames):
+        for lengths in ([40, 40, 40, 40, 40], [40, 25, 0, 7, 1], [0, 0, 3, 0, 0]):
+            # truncated like PigpioMulti._prepare
+            lengths = np.array(lengths)
+            frame = grb[:, :lengths.max()].copy()
+            frame[np.arange(frame.shape[1])[None, :] >= lengths[:, None]] = 0
+            ones = pm.encode_slot_masks(frame, pins)
+            on, off, delay = pm.parallel_pulse_arrays(ones, pm.active_slot_masks(lengths, pins, len(ones)),
+                                                      reset=True)
+            highs, total = decode_pulses(on, off, delay, pins)
+            if total != len(ones) * period + pm.RESET_US:
+                raise SystemExit(f"Frame {f}, lengths {lengths.tolist()}: lasts {total} us")
+            for s, pin in enumerate(pins):
+                bits = np.unpackbits(frame[s, :lengths[s]].reshape(-1)).tolist()
+                sent = [(start, pm.T1H_US if bit else pm.T0H_US) for start, bit in
+                        zip(range(0, len(bits) * period, period), bits)]
+                if highs[pin] != sent:
+                    raise SystemExit(f"Frame {f}, lengths {lengths.tolist()}: GPIO {pin} would not "
+                                     f"receive its bits")
+
+def original_water_step(levels, capacities, flow_rates, spring_rate, time_step=1.0):
+    """update_water_system() as case1.py had it before TerraceSimulator, on one scenario's lists."""
+    levels[-1] += spring_rate * time_step
+    for i in range(len(levels) - 1, 0, -1):
+        if levels[i] > capacities[i]:
+            overflow = levels[i] - capacities[i]
+            actual_transfer = min(overflow, flow_rates[i] * time_step)
+            levels[i] -= actual_transfer
+            levels[i - 1] += actual_transfer
+    if levels[0] > 0:
+        outflow = min(levels[0], flow_rates[0] * time_step)
+        levels[0] -= outflow
+
+def check_simulator(steps=600):
+    """TerraceSimulator, on both cascade paths, gives bit for bit the levels of the original loop."""
+    rng = np.random.default_rng(2)
+    for scenarios, terraces in ((1, 5), (3, 5), (64, 5), (3, 40)):
+        capacities = rng.uniform(100, 500, (scenarios, terraces))
+        flow_rates = rng.uniform(0.3, 5.0, (scenarios, terraces))
+        levels = capacities * rng.uniform(0.0, 1.3, (scenarios, terraces))
+        springs = rng.uniform(0.0, 15.0, (steps // 50, scenarios))
+        sim = TerraceSimulator(capacities, flow_rates, levels, springs[0], scenarios=scenarios)
+        # step() picks the sweeps for few scenarios on a deep chain; the copy always takes the wavefront
+        wavefront = sim.copy()
+        wavefront._cascade_sweeps = lambda dt: False
+        expected = levels.tolist()
+        for k in range(steps):
+            # rain changes every 50 steps, like heavy_rain_active being toggled
+            for run in (sim, wavefront):
+                run.spring_rate[:] = springs[k // 50]
+                run.step(1.0)
+            for s in range(scenarios):
+                original_water_step(expected[s], capacities[s].tolist(), flow_rates[s].tolist(),
+                                    float(springs[k // 50, s]))
+            for name, run in (("step()", sim), ("wavefront cascade", wavefront)):
+                if not np.array_equal(run.levels, expected):
+                    raise SystemExit(f"{scenarios}x{terraces} terraces, step {k + 1}: {name} levels "
+                                     f"differ from the original loop")
+
+def check_forecast(scenarios=64, horizon=4 * 3600, dt=1.0):
+    """
+    Every forecast time (50/75/100%, flood) against stepping the same scenarios: at that time the
+    stepped level has reached the target, and before it the level was still below it, both to
+    within one step's worth of water (a terrace gains or loses at most spring + 2 * flow_rate per
+    second). Times would not do: a terrace that fills slowly turns a small level error into a
+    large time error.
+    """
+    rng = np.random.default_rng(4)
+    capacities = rng.uniform(100, 500, (scenarios, 5))
+    flow_rates = rng.uniform(0.3, 5.0, (scenarios, 5))
+    levels = capacities * rng.uniform(0.0, 1.3, (scenarios, 5))
+    spring = rng.uniform(0.0, 15.0, scenarios)
+    sim = TerraceSimulator(capacities, flow_rates, levels, spring, scenarios=scenarios)
+    tolerance = dt * (spring + 2 * flow_rates.max(axis=1))
+    due = {}    # step -> events forecast for its time
+    never = []
+    for s in range(scenarios):
+        forecast = forecast_sim(sim, s, horizon)
+        for i in range(5):
+            for pct in THRESHOLDS + (None,):
+                at = forecast.flood_at[i] if pct is None else forecast.time_to[i][pct]
+                event = (s, i, capacities[s, i] * (pct or 100) / 100, pct or "flood")
+                if at is None:
+                    never.append(event)
+                else:
+                    due.setdefault(int(round(at / dt)), []).append(event + (at,))
+    peak = np.full(sim.levels.shape, -np.inf)   # highest level before the current step
+    for k in range(int(horizon / dt) + 1):
+        for s, i, target, what, at in due.get(k, ()):
+            if sim.levels[s, i] < target - tolerance[s] or peak[s, i] > target + tolerance[s]:
+                raise SystemExit(f"Scenario {s}, Level {i + 1}: forecast {what} at {at:.1f} s, stepping "
+                                 f"has {sim.levels[s, i]:.1f} L then (target {target:.1f} L, "
+                                 f"{peak[s, i]:.1f} L before)")
+        np.maximum(peak, sim.levels, out=peak)
+        sim.step(dt)
+    for s, i, target, what in never:
+        if peak[s, i] > target + tolerance[s]:
+            raise SystemExit(f"Scenario {s}, Level {i + 1}: forecast never {what}, stepping reaches "
+                             f"{peak[s, i]:.1f} L (target {target:.1f} L)")
+
+CHECKS = [check_streaming, check_wave_cache, check_fragment_chain, check_encoder, check_simulator,
+          check_forecast]
+
+def main():
+    for check in CHECKS:
+        check()
+        print(f"{check.__name__}: ok")
+
+if __name__ == "__main__":
+    main()
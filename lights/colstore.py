@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# colstore.py
+# Column store: a directory with one raw binary file per column and a schema.json.
+# Rows are only ever appended; every column has a fixed width, so a column file can be
+# memory-mapped and sliced without reading the rest.
+#
+#     store = ColumnWriter("runs/sweep1", [("sample", "<u4"), ("peak_pct", "<f4", (5,))])
+#     store.append({"sample": ids, "peak_pct": peaks})
+#     store.close()
+#     cols = read_columns("runs/sweep1")   # {"sample": memmap, "peak_pct": memmap}
+#
+# Time series (rows appended in time order, e.g. one per simulation tick) can be queried by time
+# range and downsampled per time window, reading the files in chunks:
+#     query("runs/day1", 3600, 7200, ["levels"])        # rows with 3600 <= time < 7200
+#     downsample("runs/day1", "levels", every=60)        # per-minute min / max / mean
+
+import json
+import os
+
+import numpy as np
+
+SCHEMA = "schema.json"
+
+CHUNK_ROWS = 1 << 16   # rows per chunk read by downsample()
+
+class ColumnWriter:
+    """
+    columns: list of (name, dtype) or (name, dtype, per-row shape)
+    append: keep the rows of an existing store with the same columns and add to them
+    overwrite: replace an existing store; without append or overwrite a store that already has
+    rows is refused (FileExistsError) rather than truncated
+    """
+    def __init__(self, path, columns, meta=None, append=False, overwrite=False):
+        self.path = path
+        self.columns = []
+        for column in columns:
+            name, dtype = column[0], np.dtype(column[1])
+            shape = tuple(column[2]) if len(column) > 2 else ()
+            self.columns.append((name, dtype, shape))
+        self.meta = meta or {}
+        self.rows = 0
+        os.makedirs(path, exist_ok=True)
+        mode = "wb"
+        schema = read_schema(path) if os.path.exists(os.path.join(path, SCHEMA)) else None
+        if schema is not None and schema["rows"] and not (append or overwrite):
+            raise FileExistsError(f"{path} already holds {schema['rows']} rows; append to it, overwrite it "
+                                  f"or pick another directory")
+        if append and schema is not None:
+            if schema["columns"] != self._schema_columns():
+                raise ValueError(f"{path} has different columns")
+            self.rows = schema["rows"]
+            self.meta = dict(schema["meta"], **self.meta)
+            # drop anything written after the last flush, so every column has the same rows
+            for name, dtype, shape in self.columns:
+                os.truncate(os.path.join(path, name + ".bin"), self.rows * dtype.itemsize * int(np.prod(shape)))
+            mode = "ab"
+        self._files = {name: open(os.path.join(path, name + ".bin"), mode) for name, _, _ in self.columns}
+        self._write_schema()
+
+    def _schema_columns(self):
+        return [{"name": n, "dtype": d.str, "shape": list(s)} for n, d, s in self.columns]
+
+    def _write_schema(self):
+        schema = {
+            "rows": self.rows,
+            "columns": self._schema_columns(),
+            "meta": self.meta,
+        }
+        tmp = os.path.join(self.path, SCHEMA + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(schema, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, SCHEMA))
+
+    def append(self, values):
+        """Append rows; values maps every column name to an array with the same number of rows."""
+        count = None
+        blocks = {}
+        for name, dtype, shape in self.columns:
+            block = np.ascontiguousarray(values[name], dtype=dtype)
+            block = block.reshape((-1,) + shape)
+            if count is not None and len(block) != count:
+                raise ValueError(f"column {name} has {len(block)} rows, expected {count}")
+            count = len(block)
+            blocks[name] = block
+        for name, block in blocks.items():
+            self._files[name].write(block.tobytes())
+        self.rows += count
+        return count
+
+    def flush(self):
+        """Make the rows appended so far visible to readers."""
+        for f in self._files.values():
+            f.flush()
+        self._write_schema()
+
+    def close(self):
+        if self._files is None:
+            return
+        self.flush()
+        for f in self._files.values():
+            f.close()
+        self._files = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_schema(path):
+    with open(os.path.join(path, SCHEMA)) as f:
+        return json.load(f)
+
+def read_columns(path, names=None):
+    """Memory-map the columns of a store (all, or the given names) up to its committed row count."""
+    schema = read_schema(path)
+    rows = schema["rows"]
+    columns = {}
+    for column in schema["columns"]:
+        if names is not None and column["name"] not in names:
+            continue
+        dtype = np.dtype(column["dtype"])
+        shape = (rows,) + tuple(column["shape"])
+        if rows == 0:
+            columns[column["name"]] = np.zeros(shape, dtype=dtype)
+        else:
+            columns[column["name"]] = np.memmap(os.path.join(path, column["name"] + ".bin"),
+                                                dtype=dtype, mode="r", shape=shape)
+    return columns
+
+def time_range(times, start=None, end=None):
+    """Slice of the rows with start <= time < end; times must be ascending (binary search)."""
+    first = 0 if start is None else int(np.searchsorted(times, start, side="left"))
+    last = len(times) if end is None else int(np.searchsorted(times, end, side="left"))
+    return slice(first, max(first, last))
+
+def query(path, start=None, end=None, names=None, time_column="time"):
+    """Memory-mapped rows of a time series store with start <= time < end."""
+    names = None if names is None else list(names) + [time_column]
+    columns = read_columns(path, names)
+    rows = time_range(columns[time_column], start, end)
+    return {name: column[rows] for name, column in columns.items()}
+
+def downsample(path, name, every, start=None, end=None, time_column="time", chunk_rows=CHUNK_ROWS):
+    """
+    Min, max and mean of a column per window of `every` time units (windows start at `start`, or
+    the first row), for plotting long runs. Only chunk_rows rows are in memory at a time.
+    Returns {"time": window starts, "min", "max", "mean", "count"}; empty windows are left out.
+    """
+    columns = read_columns(path, [time_column, name])
+    times, values = columns[time_column], columns[name]
+    rows = time_range(times, start, end)
+    shape = values.shape[1:]
+    parts = []
+    origin = 0.0
+    if rows.stop > rows.start:
+        origin = float(times[rows.start]) if start is None else start
+    for first in range(rows.start, rows.stop, chunk_rows):
+        last = min(first + chunk_rows, rows.stop)
+        window = np.floor((np.asarray(times[first:last]) - origin) / every).astype(np.int64)
+        block = np.asarray(values[first:last], dtype=np.float64)
+        starts = np.flatnonzero(np.diff(window, prepend=window[0] - 1))
+        parts.append((window[starts], np.minimum.reduceat(block, starts), np.maximum.reduceat(block, starts),
+                      np.add.reduceat(block, starts), np.diff(np.append(starts, len(window)))))
+    if not parts:
+        empty = np.zeros((0,) + shape)
+        return {"time": np.zeros(0), "min": empty, "max": empty, "mean": empty, "count": np.zeros(0, dtype=np.int64)}
+    ids, mins, maxs, sums, counts = (np.concatenate(p) for p in zip(*parts))
+    # a window cut by a chunk boundary shows up twice in a row: combine it
+    starts = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1))
+    counts = np.add.reduceat(counts, starts)
+    return {
+        "time": origin + ids[starts] * every,
+        "min": np.minimum.reduceat(mins, starts),
+        "max": np.maximum.reduceat(maxs, starts),
+        "mean": np.add.reduceat(sums, starts) / counts.reshape((-1,) + (1,) * len(shape)),
+        "count": counts,
+    }
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# fake_pigpio.py
+# Stand-in for the pigpio module and daemon so PigpioMulti can be run and timed off the Pi.
+# Nothing is transmitted: waves are only recorded. Under CPS_VIRTUAL the transmitted pulses are
+# also decoded back into WS2812 pixels and every latched frame goes to the capture file of
+# virtual_strip.py, like the neopixel scripts' frames.
+
+import importlib.util
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+OUTPUT = 1
+
+WAVE_MODE_ONE_SHOT = 0
+WAVE_MODE_REPEAT = 1
+WAVE_MODE_ONE_SHOT_SYNC = 2
+WAVE_MODE_REPEAT_SYNC = 3
+
+WAVE_CHAIN_MAX_LOOPS = 20  # loop counters of one wave_chain call
+
+WAVE_NOT_FOUND = 9998
+NO_TX_WAVE = 9999
+
+class error(Exception):
+    """Raised like pigpio.error when the daemon rejects a call"""
+
+class pulse:
+    """Same fields as pigpio.pulse"""
+    def __init__(self, gpio_on, gpio_off, delay):
+        self.gpio_on = gpio_on
+        self.gpio_off = gpio_off
+        self.delay = delay
+
+# WS2812 decoding: a high time above this (between T0H_US and T1H_US of pigpio.py) is a '1'
+ONE_THRESHOLD_US = 600
+
+class WireDecoder:
+    """
+    Turns transmitted pulses back into pixels per pin and captures each latched frame.
+    The strips latch when the line goes idle: the daemon reports it is no longer busy, or a new
+    transmission replaces the current one (segments queued with a *_SYNC mode continue it).
+    """
+    def __init__(self, capture, clock):
+        self.capture = capture
+        self.clock = clock
+        self.strips = {}        # pin -> strip index (order of set_mode)
+        self.pixels = {}        # pin -> (n, 3) r,g,b the strip shows
+        self._bits = {}         # pin -> bits received since the last latch
+        self._high = {}         # pin -> time it went high
+        self._t = 0
+
+    def feed(self, pulses):
+        for on, off, delay in pulses:
+            for pin in _pins(on):
+                self._high.setdefault(pin, self._t)
+            for pin in _pins(off):
+                if pin in self._high:
+                    high = self._t - self._high.pop(pin)
+                    self._bits.setdefault(pin, []).append(high > ONE_THRESHOLD_US)
+            self._t += delay
+
+    def latch(self):
+        for pin, bits in sorted(self._bits.items(), key=lambda item: self.strips.get(item[0], item[0])):
+            grb = np.packbits(np.array(bits[:len(bits) // 24 * 24], dtype=np.uint8)).reshape(-1, 3)
+            shown = self.pixels.setdefault(pin, np.zeros((0, 3), dtype=np.uint8))
+            if len(grb) > len(shown):
+                shown = self.pixels[pin] = np.concatenate([shown, np.zeros((len(grb) - len(shown), 3), np.uint8)])
+            # pixels past the data keep their color
+            shown[:len(grb)] = grb[:, [1, 0, 2]]
+            self.capture.append(self.clock.time(), self.strips.get(pin, pin), pin, 1.0, shown)
+        self._bits = {}
+        self._high = {}
+
+@lru_cache(maxsize=None)
+def _pins(mask):
+    return tuple(pin for pin in range(32) if mask >> pin & 1)
+
+# pigpiod socket protocol: every command is a 16-byte header, plus its extension data
+CMD_HEADER_BYTES = 16
+PULSE_BYTES = 12  # gpio_on, gpio_off, delay as three uint32
+
+class pi:
+    """
+    Records what would have been sent to pigpiod.
+    waves: wave id -> list of pulses
+    sent: wave ids in the order they were transmitted
+    chains: data of every wave_chain call
+    commands / bytes_sent: socket commands and bytes the real client would have sent
+    Wave ids and wave memory are limited like the daemon's (max_waves ids, max_pulses, max_cbs),
+    and control blocks are handed out the way pigpiod does: as a stack. wave_delete only flags a
+    wave; its CBs come back once every wave above it is deleted too, or a new wave of exactly the
+    same shape takes over its id: the same numbers of CBs, of BOOL words (pin masks, one per
+    gpio_on/gpio_off) and of TOOL words (read/tick flags, never used by generic pulses).
+    wave_create_and_pad pads all three to a percentage of the pool, so waves padded alike always
+    match. The OOL pool is taken as the same size as the CB pool.
+    Transmission takes no time, except that a wave queued behind another with
+    WAVE_MODE_ONE_SHOT_SYNC takes over the line at the next wave_tx_at() poll.
+    """
+    def __init__(self, host="localhost", port=8888, max_pulses=12000, max_cbs=25016, max_waves=250,
+                 capture=None):
+        self.connected = True
+        self.max_pulses = max_pulses
+        self.max_cbs = max_cbs
+        self.max_waves = max_waves
+        self.modes = {}
+        self.levels = {}
+        self.waves = {}
+        self.sent = []
+        self.chains = []
+        self.commands = 0
+        self.bytes_sent = 0
+        self._pending = []
+        self._slots = []    # per wave id from the bottom of the pool: [(CBs, BOOLs, TOOLs), deleted]
+        self._tx = []   # wave on the line, then the ones queued behind it
+        # capture: decode frames into the virtual capture file (default: when CPS_VIRTUAL is set)
+        self.decoder = None
+        if capture is None:
+            capture = bool(os.environ.get("CPS_VIRTUAL"))
+        if capture:
+            import virtual_strip
+            self.decoder = WireDecoder(virtual_strip.capture(), virtual_strip.clock)
+
+    def _command(self, ext_bytes=0):
+        self.commands += 1
+        self.bytes_sent += CMD_HEADER_BYTES + ext_bytes
+
+    def set_mode(self, gpio, mode):
+        self._command()
+        self.modes[gpio] = mode
+        if self.decoder is not None:
+            self.decoder.strips.setdefault(gpio, len(self.decoder.strips))
+        return 0
+
+    def write(self, gpio, level):
+        self._command()
+        self.levels[gpio] = level
+        return 0
+
+    def wave_clear(self):
+        self._command()
+        self.waves.clear()
+        self._slots = []
+        self._pending = []
+        return 0
+
+    def wave_add_new(self):
+        self._command()
+        self._pending = []
+        return 0
+
+    def wave_add_generic(self, pulses):
+        self._command(PULSE_BYTES * len(pulses))
+        self._pending.extend(pulses)
+        if len(self._pending) > self.max_pulses:
+            self._pending = []
+            raise error("'too many pulses'")
+        return len(self._pending)
+
+    def wave_get_max_pulses(self):
+        self._command()
+        return self.max_pulses
+
+    def wave_get_max_cbs(self):
+        self._command()
+        return self.max_cbs
+
+    def wave_create(self):
+        self._command()
+        return self._create(self._pending_shape())
+
+    def wave_create_and_pad(self, percent):
+        self._command()
+        cbs, bools, tools = self._pending_shape()
+        # pigpiod pads CBs and BOOLs to percent of their pools, TOOLs to 0
+        shape = (self.max_cbs * percent // 100, self.max_cbs * percent // 100, 0)
+        if cbs > shape[0]:
+            self._pending = []
+            raise error("'No more CBs for waveform'")
+        if bools > shape[1] or tools > shape[2]:
+            self._pending = []
+            raise error("'No more OOL for waveform'")
+        return self._create(shape)
+
+    def _pending_shape(self):
+        bools = sum((p.gpio_on != 0) + (p.gpio_off != 0) for p in self._pending)
+        delays = sum(p.delay != 0 for p in self._pending)
+        return (bools + delays, bools, 0)
+
+    def _create(self, shape):
+        # a deleted wave of exactly the same shape is reused in place
+        wid = next((w for w, (s, deleted) in enumerate(self._slots) if deleted and s == shape), None)
+        if wid is None:
+            if self.cbs_in_use() + shape[0] > self.max_cbs:
+                self._pending = []
+                raise error("'No more CBs for waveform'")
+            if len(self._slots) >= self.max_waves:
+                self._pending = []
+                raise error("'No more waveforms'")
+            wid = len(self._slots)
+            self._slots.append([shape, False])
+        self._slots[wid][1] = False
+        self.waves[wid] = self._pending
+        self._pending = []
+        return wid
+
+    def cbs_in_use(self):
+        """Control blocks up to the top of the pool, deleted waves below the top included."""
+        return sum(shape[0] for shape, _ in self._slots)
+
+    def wave_delete(self, wave_id):
+        self._command()
+        if wave_id in self._tx[:-1]:
+            # still on the line: the wave queued behind it has not taken over yet
+            raise error("'wave deleted while transmitting'")
+        if self.waves.pop(wave_id, None) is not None:
+            self._slots[wave_id][1] = True
+            # the pool only shrinks from the top
+            while self._slots and self._slots[-1][1]:
+                self._slots.pop()
+        return 0
+
+    def wave_send_once(self, wave_id):
+        return self.wave_send_using_mode(wave_id, WAVE_MODE_ONE_SHOT)
+
+    def wave_send_using_mode(self, wave_id, mode):
+        self._command()
+        if wave_id not in self.waves:
+            raise error("'attempt to send unknown wave id'")
+        self.sent.append(wave_id)
+        sync = mode in (WAVE_MODE_ONE_SHOT_SYNC, WAVE_MODE_REPEAT_SYNC)
+        if self.decoder is not None:
+            if not sync:
+                self.decoder.latch()
+            self.decoder.feed(self.wave_pulses(wave_id))
+        if sync:
+            self._tx.append(wave_id)
+        else:
+            self._tx = [wave_id]
+        return len(self.waves[wave_id])
+
+    def wave_chain(self, data):
+        self._command(len(data))
+        if _chain_loops(data) > WAVE_CHAIN_MAX_LOOPS:
+            raise error("'too many chain counters'")
+        self.chains.append(list(data))
+        if self.decoder is not None:
+            self.decoder.latch()
+            self.decoder.feed(self.chain_pulses(data))
+        self._tx = []
+        return 0
+
+    def wave_tx_busy(self):
+        self._command()
+        self._tx = []
+        if self.decoder is not None:
+            self.decoder.latch()
+        return 0
+
+    def wave_tx_at(self):
+        self._command()
+        if len(self._tx) > 1:
+            # the current wave ends and the queued one starts
+            self._tx.pop(0)
+        return self._tx[0] if self._tx else NO_TX_WAVE
+
+    def stop(self):
+        self.connected = False
+
+    def wave_pulses(self, wave_id):
+        """A recorded wave as (gpio_on, gpio_off, delay) tuples."""
+        return [(p.gpio_on, p.gpio_off, p.delay) for p in self.waves[wave_id]]
+
+    def chain_pulses(self, data):
+        """Expand wave_chain data into the pulses it transmits (delay commands become idle pulses)."""
+        out = []
+        stack = []
+        i = 0
+        while i < len(data):
+            if data[i] != 255:
+                out.extend(self.wave_pulses(data[i]))
+                i += 1
+            elif data[i + 1] == 0:
+                stack.append(len(out))
+                i += 2
+            elif data[i + 1] == 1:
+                start = stack.pop()
+                block = out[start:]
+                out.extend(block * (data[i + 2] + 256 * data[i + 3] - 1))
+                i += 4
+            elif data[i + 1] == 2:
+                out.append((0, 0, data[i + 2] + 256 * data[i + 3]))
+                i += 4
+            else:
+                raise ValueError("unsupported chain command %d" % data[i + 1])
+        return out
+
+def _chain_loops(data):
+    """Loop starts (255 0) in wave_chain data."""
+    loops = 0
+    i = 0
+    while i < len(data):
+        if data[i] != 255:
+            i += 1
+        elif data[i + 1] == 0:
+            loops += 1
+            i += 2
+        else:
+            # loop repeat / delay: 255 x lo hi
+            i += 4
+    return loops
+
+def load_pigpio_multi():
+    """
+    Import lights/pigpio.py (PigpioMulti, StripProxy, ...) with this module standing in for pigpio.
+    The file shares its name with the real library, so it is loaded under the name pigpio_multi.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pigpio.py")
+    spec = importlib.util.spec_from_file_location("pigpio_multi", path)
+    module = importlib.util.module_from_spec(spec)
+    saved = sys.modules.get("pigpio")
+    sys.modules["pigpio"] = sys.modules[__name__]
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        if saved is None:
+            del sys.modules["pigpio"]
+        else:
+            sys.modules["pigpio"] = saved
+    return module
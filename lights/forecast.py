@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# forecast.py
+# When will each terrace reach 50/75/100% and when does flooding start, for the current
+# spring rate, flow rates and levels of a TerraceSimulator.
+#
+# Between events the model is linear: every terrace fills at a constant rate (what comes in
+# from above minus what it passes on), so the forecaster jumps from one event to the next
+# instead of stepping second by second. Events are a terrace reaching its capacity (it starts
+# passing water on), a flooded terrace draining back to capacity, and Level 1 running dry.
+# The step model passes at most flow_rate * dt per second, so this matches it to within a step's
+# worth of water (check.py); where a terrace fills slowly that can be several seconds.
+
+THRESHOLDS = (50, 75, 100)
+
+class Forecast:
+    """
+    time_to[i][pct]: seconds until terrace i first holds pct% of its capacity (0 if it already
+                     does, None if it does not happen within the horizon)
+    flood_at[i]: seconds until terrace i goes above capacity, FLOOD in the status table (None: never)
+    time_to_flood: the earliest of flood_at, or None
+    levels: litres per terrace at the end of the forecast
+    steady: True if the levels stopped changing before the horizon
+    """
+    def __init__(self, terraces):
+        self.time_to = [dict.fromkeys(THRESHOLDS) for _ in range(terraces)]
+        self.flood_at = [None] * terraces
+        self.levels = []
+        self.events = 0
+        self.steady = False
+        self.horizon = None
+
+    @property
+    def time_to_flood(self):
+        times = [t for t in self.flood_at if t is not None]
+        return min(times) if times else None
+
+def rates_of_change(levels, capacities, flow_rates, spring_rate, eps):
+    """Net litres per second for each terrace in the current regime (top → bottom cascade)."""
+    n = len(levels)
+    net = [0.0] * n
+    inflow = spring_rate
+    for i in range(n - 1, 0, -1):
+        if levels[i] > capacities[i] + eps[i]:
+            out = flow_rates[i]                 # flooded: passes on as much as it can
+        elif levels[i] >= capacities[i] - eps[i]:
+            out = min(inflow, flow_rates[i])    # full: passes on what arrives, up to its flow rate
+        else:
+            out = 0.0                           # still filling
+        net[i] = inflow - out
+        inflow = out
+    if levels[0] > eps[0]:
+        net[0] = inflow - flow_rates[0]
+    else:
+        net[0] = inflow - min(inflow, flow_rates[0])  # dry: drains whatever arrives
+    return net
+
+def forecast(capacities, flow_rates, levels, spring_rate, horizon=86400.0, max_events=1000):
+    """Event-driven forecast for one scenario; arguments are per-terrace lists (bottom → top)."""
+    n = len(levels)
+    capacities = [float(c) for c in capacities]
+    flow_rates = [float(r) for r in flow_rates]
+    levels = [float(l) for l in levels]
+    eps = [1e-9 * max(c, 1.0) for c in capacities]
+    result = Forecast(n)
+    result.horizon = horizon
+
+    t = 0.0
+    while result.events < max_events:
+        net = rates_of_change(levels, capacities, flow_rates, spring_rate, eps)
+
+        # a terrace floods when it is above capacity, or at capacity and still gaining water
+        for i in range(n):
+            if result.flood_at[i] is None and (levels[i] > capacities[i] + eps[i]
+                                               or levels[i] >= capacities[i] - eps[i] and net[i] > 0):
+                result.flood_at[i] = t
+
+        # time until the next regime change
+        step = horizon - t
+        for i in range(n):
+            if levels[i] < capacities[i] - eps[i] and net[i] > 0:
+                step = min(step, (capacities[i] - levels[i]) / net[i])
+            elif i > 0 and levels[i] > capacities[i] + eps[i] and net[i] < 0:
+                step = min(step, (levels[i] - capacities[i]) / -net[i])
+            elif i == 0 and levels[0] > eps[0] and net[0] < 0:
+                step = min(step, levels[0] / -net[0])
+
+        # threshold crossings along the way
+        for i in range(n):
+            for pct in THRESHOLDS:
+                target = capacities[i] * pct / 100
+                if result.time_to[i][pct] is not None:
+                    continue
+                if levels[i] >= target - eps[i]:
+                    result.time_to[i][pct] = t
+                elif net[i] > 0 and levels[i] + net[i] * step >= target - eps[i]:
+                    result.time_to[i][pct] = t + (target - levels[i]) / net[i]
+
+        if all(abs(r) <= 1e-12 for r in net):
+            result.steady = True
+            break
+        for i in range(n):
+            levels[i] += net[i] * step
+            # land exactly on the boundary that ended this segment
+            if abs(levels[i] - capacities[i]) <= eps[i]:
+                levels[i] = capacities[i]
+            if abs(levels[i]) <= eps[i]:
+                levels[i] = 0.0
+        t += step
+        result.events += 1
+        if t >= horizon:
+            break
+
+    result.levels = levels
+    return result
+
+def forecast_sim(sim, scenario=0, horizon=86400.0):
+    """Forecast one scenario of a TerraceSimulator (default chain topology) with its current rates."""
+    if not sim.topology.is_chain or sim.node_inflows is not None or sim.topology.own_rate.any():
+        raise ValueError("the forecaster only handles the default terrace chain")
+    return forecast(sim.capacities[scenario], sim.flow_rates[scenario], sim.levels[scenario],
+                    float(sim.spring_rate[scenario]), horizon)
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "never"
+    if seconds <= 0:
+        return "now"
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}min"
+    return f"{seconds / 3600:.1f}h"
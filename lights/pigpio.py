@@ -3,10 +3,22 @@
 # Minimal-change replacement for Adafruit NeoPixel usage using pigpio.
 # Requires pigpio daemon (sudo systemctl enable --now pigpiod)
 
-import pigpio
+import os
 import time
 import atexit
-from threading import Lock
+import hashlib
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock, Thread, Timer
+
+import numpy as np
+
+if os.environ.get("CPS_VIRTUAL"):
+    # headless run: waves are only recorded (see fake_pigpio.py)
+    import fake_pigpio as pigpio
+else:
+    import pigpio
 
 # -----------------------------
 # Minimal Multi-strip pigpio NeoPixel implementation
@@ -20,138 +32,780 @@ T0H_US = 400  # high time for '0'
 T0L_US = 850  # low time for '0'
 RESET_US = 60  # Reset time in microseconds (>50us)
 
+# pigpio limits
+MAX_WAVES = 250  # wave ids available in the daemon (PI_MAX_WAVES)
+WAVE_CHAIN_MAX = 600  # bytes accepted by one wave_chain call
+WAVE_CHAIN_MAX_LOOPS = 20  # loop counters available to one wave_chain call
+PI_WAVE_MAX_PULSES = 12000  # pulses per wave, used if the daemon cannot be asked
+PI_WAVE_MAX_CBS = 25016  # DMA control blocks shared by all created waves, used if the daemon cannot be asked
+
 # Helper: clamp color
 def clamp_color(c):
     return (int(max(0, min(255, c[0]))),
             int(max(0, min(255, c[1]))),
             int(max(0, min(255, c[2]))))
 
+# Helper: clamp many colors at once (any array-like of shape (..., 3))
+def clamp_colors(colors):
+    return np.clip(np.asarray(colors), 0, 255).astype(np.uint8)
+
+# Wire order of the colour channels (index into an (r, g, b) tuple)
+GRB_ORDER = [1, 0, 2]
+
+def encode_slot_masks(grb, pins):
+    """
+    Turn a frame into one GPIO mask per bit slot.
+    grb: uint8 array of shape (strips, pixels, 3) already in wire (GRB) order
+    pins: GPIO number for each strip
+    Returns a uint32 array; bit `pin` of entry k is set when that strip sends a '1' in slot k.
+    """
+    # MSB-first bits of every byte, one row per strip
+    bits = np.unpackbits(grb.reshape(len(pins), -1), axis=1)
+    weights = np.array([1 << p for p in pins], dtype=np.uint32)
+    return np.bitwise_or.reduce(bits * weights[:, None], axis=0)
+
+def active_slot_masks(lengths, pins, slots):
+    """
+    Per-bit-slot mask of the pins that are sending data: strip s is driven for its first
+    lengths[s] pixels (24 slots each) and left alone after that.
+    """
+    weights = np.array([1 << p for p in pins], dtype=np.uint32)
+    driven = np.arange(slots)[None, :] < np.asarray(lengths)[:, None] * 24
+    return np.bitwise_or.reduce(driven * weights[:, None], axis=0)
+
+def parallel_pulse_arrays(ones, active, reset=False):
+    """
+    Parallel WS2812 encoding of many pins at once, as (gpio_on, gpio_off, delay) arrays.
+    Each slot: every active pin goes high, '0' pins drop after T0H_US, '1' pins after T1H_US,
+    and the line stays low for the rest of the slot (T0H_US + T0L_US == T1H_US + T1L_US).
+    A pulse that changes nothing (no pins, or the same pins as the pulse before it) is merged
+    into the previous pulse's delay, so a frame needs as few pulses as its bit pattern allows.
+    reset: end with the RESET_US latch time.
+    """
+    ones = np.asarray(ones, dtype=np.uint32)
+    active = np.asarray(active, dtype=np.uint32)
+    n = len(ones)
+    on = np.zeros(3 * n + 1, dtype=np.uint32)
+    off = np.zeros(3 * n + 1, dtype=np.uint32)
+    delay = np.zeros(3 * n + 1, dtype=np.int64)
+    on[0:-1:3] = active
+    off[1:-1:3] = active & ~ones
+    off[2:-1:3] = ones
+    delay[0:-1:3] = T0H_US
+    delay[1:-1:3] = T1H_US - T0H_US
+    delay[2:-1:3] = T1L_US
+    delay[-1] = RESET_US if reset else 0
+
+    keep = np.flatnonzero((on != 0) | (off != 0))
+    if len(keep):
+        same = (on[keep[1:]] == on[keep[:-1]]) & (off[keep[1:]] == off[keep[:-1]])
+        keep = keep[np.concatenate(([True], ~same))]
+    if not len(keep) or keep[0] != 0:
+        # the first pulse carries the leading delay even if it changes nothing
+        keep = np.concatenate(([0], keep))
+    total = np.concatenate(([0], np.cumsum(delay)))
+    merged = total[np.append(keep[1:], len(delay))] - total[keep]
+    return on[keep], off[keep], merged
+
+def make_pulses(on, off, delay):
+    """pigpio.pulse list for the arrays; identical pulses share one object."""
+    table = {}
+    pulses = []
+    for p in zip(on.tolist(), off.tolist(), delay.tolist()):
+        pulse = table.get(p)
+        if pulse is None:
+            pulse = table[p] = pigpio.pulse(*p)
+        pulses.append(pulse)
+    return pulses
+
+def pulse_cbs(on, off, delay):
+    """DMA control blocks each pulse takes from pigpio's pool: pins set, pins cleared, delay."""
+    return (np.asarray(on) != 0).astype(np.int64) + (np.asarray(off) != 0) + (np.asarray(delay) != 0)
+
+def split_segments(cbs, cb_limit, pulse_limit):
+    """(start, end) pulse ranges that each take at most cb_limit control blocks and pulse_limit pulses."""
+    total = np.cumsum(cbs)
+    bounds = []
+    start = 0
+    while start < len(total):
+        used = int(total[start - 1]) if start else 0
+        end = min(int(np.searchsorted(total, used + cb_limit, side="right")), start + pulse_limit)
+        if end <= start:
+            raise RuntimeError("pigpio has only %d control blocks left for a frame segment" % cb_limit)
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+def slot_pulses(ones, active):
+    """Pulses for one bit slot where the pins in active send a bit and the pins in ones send a '1'."""
+    return make_pulses(*parallel_pulse_arrays([ones], [active]))
+
+def byte_pulses(value, mask):
+    """Pulses for the 8 bits of one byte (MSB first) on the pins in mask."""
+    ones = [mask if (value >> bit) & 1 else 0 for bit in range(7, -1, -1)]
+    return make_pulses(*parallel_pulse_arrays(ones, [mask] * 8))
+
+def chain_blocks(blocks, wids):
+    """
+    Build wave_chain data that sends each row of blocks in turn, where wids maps a symbol to its wave id.
+    A row is one LED, so runs of identical LEDs (fills) become a single loop instead of repeated ids.
+    pigpio has only WAVE_CHAIN_MAX_LOOPS loop counters, so past that the runs a loop saves the
+    fewest bytes on are written out instead. Ends with the reset delay.
+    """
+    chain = []
+    n = len(blocks)
+    if n:
+        changed = np.any(blocks[1:] != blocks[:-1], axis=1)
+        starts = np.flatnonzero(np.concatenate(([True], changed))).tolist()
+        runs = [([wids[s] for s in blocks[start].tolist()], end - start)
+                for start, end in zip(starts, starts[1:] + [n])]
+        # loop start (255 0) + loop repeat (255 1 x y) cost 6 bytes
+        saved = {r: repeat * len(ids) - len(ids) - 6 for r, (ids, repeat) in enumerate(runs)
+                 if repeat * len(ids) > len(ids) + 6}
+        looped = set(sorted(saved, key=saved.get, reverse=True)[:WAVE_CHAIN_MAX_LOOPS])
+        loops = 0
+        for r, (ids, repeat) in enumerate(runs):
+            while repeat:
+                count = min(repeat, 0xFFFF)
+                if r in looped and loops < WAVE_CHAIN_MAX_LOOPS:
+                    chain.extend([255, 0] + ids + [255, 1, count & 0xFF, count >> 8])
+                    loops += 1
+                else:
+                    chain.extend(ids * count)
+                repeat -= count
+    # delay (255 2 x y) for the reset
+    chain.extend([255, 2, RESET_US & 0xFF, RESET_US >> 8])
+    return chain
+
 class PigpioMulti:
     """
     Combines multiple strips and builds a single pigpio wave for a show() call.
     This class is intentionally minimal to keep your original code simple.
     """
-    def __init__(self, pi, strips, brightness=1.0):
+    def __init__(self, pi, strips, brightness=1.0, wave_cache_size=8, fragments=False,
+                 background=False, queue_size=2, queue_policy="drop_oldest", auto_write_interval=None,
+                 gamma=None, calibration=None):
         """
         pi: pigpio.pi() instance
         strips: list of tuples (gpio_pin, led_count)
         brightness: 0.0..1.0
+        wave_cache_size: how many recently shown frames keep their wave in pigpio's wave memory
+        fragments: send frames as a wave_chain of small reusable waves (one per byte value with a
+                   single strip, one per bit-slot mask with several) instead of one wave per frame
+        background: send frames from a transmitter thread; show() then only snapshots the pixels
+        queue_size: frames that may wait for the transmitter
+        queue_policy: "drop_oldest" discards the oldest waiting frame when the queue is full,
+                      "block" makes show() wait for room
+        auto_write_interval: seconds; if set, auto_write strips defer their show() and all writes
+                             within that tick go out as one frame
+        gamma: optional gamma correction exponent (e.g. 2.2); None sends values linearly
+        calibration: optional per-strip (r, g, b) scale factors (0.0..1.0) to match strips' colors
         """
+        if queue_policy not in ("drop_oldest", "block"):
+            raise ValueError("queue_policy must be 'drop_oldest' or 'block'")
         self.pi = pi
         self.pins = [s[0] for s in strips]
         self.counts = [s[1] for s in strips]
-        self.brightness = float(brightness)
         self.lock = Lock()
 
-        # pixel buffers per strip (r,g,b tuples)
-        self.pixels = [ [(0,0,0)] * c for c in self.counts ]
+        # dirty tracking: strips written since the last show(), and the GRB frame the strips
+        # currently display (None until the first frame, when their contents are unknown).
+        # _pixel_lock covers the pixel buffer, the LUT and the dirty flags: show() may run on the
+        # auto_write tick thread while other threads write pixels
+        self._dirty = np.ones(len(self.pins), dtype=bool)
+        self._pixel_lock = Lock()
+        self._shown = None
+        self.frames_skipped = 0
+        self.pixels_sent = 0
+
+        # output lookup table (strips, 3, 256): brightness, gamma and calibration in one step.
+        # Rebuilt only when one of them changes; the pixel buffer itself is never rescaled.
+        self._brightness = float(brightness)
+        self._gamma = gamma
+        self._calibration = np.ones((len(self.pins), 3))
+        if calibration is not None:
+            self._calibration[:] = calibration
+        self._lut = None
+        self._build_lut()
+
+        # pixel buffer for all strips: (strips, max_pixels, 3) r,g,b bytes; pixels past a strip's count stay 0
+        self.pixels = np.zeros((len(self.pins), max(self.counts), 3), dtype=np.uint8)
 
         # init pins
         for p in self.pins:
             self.pi.set_mode(p, pigpio.OUTPUT)
             self.pi.write(p, 0)
 
+        # LRU of created waves: frame hash -> tuple of segment wave ids
+        self.wave_cache_size = max(1, int(wave_cache_size))
+        self._waves = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._limits = None
+        # control blocks taken by every wave this instance created: wave id -> CBs. pigpiod
+        # allocates them as a stack, so deleted waves below the top of the pool keep theirs
+        # until everything above is deleted too (or a wave of the same shape reuses the id)
+        self._wave_cbs = {}
+        self._deleted_cbs = {}
+        # frames too big for the control-block pool are streamed segment by segment
+        self.streamed_frames = 0
+        self.stream_underruns = 0
+        self._streamed = None
+        self.frames_sent = 0
+        # pulses in the most recent frame (after merging), and in all frames sent
+        self.last_frame_pulses = 0
+        self.pulses_sent = 0
+
+        # reusable fragment waves: byte value (single strip) or slot mask (multi strip) -> wave id
+        self.fragments = fragments
+        self._fragments = {}
+        self._fragment_sizes = {}
+        self.chained_frames = 0
+
+        # wave ids on the wire right now; never deleted until transmission ends
+        self._in_flight = set()
+
+        # optional transmitter thread fed with frame snapshots
+        self.queue_policy = queue_policy
+        self.frames_dropped = 0
+        self._queue = None
+        self._tx_thread = None
+        if background:
+            self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+            self._tx_thread = Thread(target=self._tx_loop, name="PigpioMulti-tx", daemon=True)
+            self._tx_thread.start()
+
+        # auto_write coalescing: batch() scopes and deferred ticks
+        self.auto_write_interval = auto_write_interval
+        self._batch_depth = 0
+        self._pending_show = False
+        self._tick_timer = None
+        self._tick_lock = Lock()
+
         atexit.register(self._cleanup)
-        self._last_wave = None
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        # like neopixel: 0.0..1.0, takes effect on the next show()
+        self._brightness = min(max(float(value), 0.0), 1.0)
+        self._build_lut()
+
+    def set_gamma(self, gamma):
+        """Gamma exponent for all strips, or None for linear output."""
+        self._gamma = gamma
+        self._build_lut()
+
+    def set_calibration(self, strip_index, scale):
+        """Per-channel (r, g, b) scale factors for one strip."""
+        self._calibration[strip_index] = scale
+        self._build_lut()
+
+    def _build_lut(self):
+        levels = np.arange(256, dtype=np.float64)
+        if self._gamma:
+            levels = np.round(255.0 * (levels / 255.0) ** self._gamma)
+        # int() truncation, same as scaling each channel by hand
+        scaled = levels[None, None, :] * self._brightness * self._calibration[:, :, None]
+        lut = np.clip(scaled, 0, 255).astype(np.uint8)
+        with self._pixel_lock:
+            self._lut = lut
+            self._dirty[:] = True
+
+    def mark_dirty(self, strip_index=None):
+        """Call after writing to self.pixels directly, so the next show() does not skip it."""
+        with self._pixel_lock:
+            if strip_index is None:
+                self._dirty[:] = True
+            else:
+                self._dirty[strip_index] = True
+
+    def strip_view(self, strip_index):
+        """Writable (count, 3) view of one strip's pixels."""
+        return self.pixels[strip_index, :self.counts[strip_index]]
 
     def set_pixel(self, strip_index, pixel_index, color):
-        self.pixels[strip_index][pixel_index] = clamp_color(color)
+        """
+        pixel_index may be an int, a slice or an index array; color is one (r,g,b)
+        (broadcast over the selection) or one color per selected pixel.
+        """
+        if isinstance(pixel_index, int) and len(color) == 3:
+            color = clamp_color(color)
+        else:
+            color = clamp_colors(color)
+        with self._pixel_lock:
+            self.strip_view(strip_index)[pixel_index] = color
+            self._dirty[strip_index] = True
 
     def fill_strip(self, strip_index, color):
         color = clamp_color(color)
-        for i in range(self.counts[strip_index]):
-            self.pixels[strip_index][i] = color
+        with self._pixel_lock:
+            self.strip_view(strip_index)[:] = color
+            self._dirty[strip_index] = True
+
+    def _frame_grb(self):
+        """Return the pixel buffer through the output LUT as a (strips, max_pixels, 3) GRB array."""
+        strips = np.arange(len(self.pins))[:, None, None]
+        order = np.array(GRB_ORDER)[None, None, :]
+        return self._lut[strips, order, self.pixels[:, :, GRB_ORDER]]
+
+    def _encode_masks(self):
+        """Per-bit-slot ('1' pins, active pins) masks for the whole pixel buffer (MSB-first GRB per LED)."""
+        ones = encode_slot_masks(self._frame_grb(), self.pins)
+        return ones, active_slot_masks(self.counts, self.pins, len(ones))
+
+    def _build_pulses(self, ones, active):
+        """Pulse list for the given slot masks, followed by the reset."""
+        return make_pulses(*parallel_pulse_arrays(ones, active, reset=True))
+
+    def _wave_limits(self):
+        """(pulses per wave, control blocks for all waves) of the daemon."""
+        if self._limits is None:
+            try:
+                self._limits = (self.pi.wave_get_max_pulses(), self.pi.wave_get_max_cbs())
+            except Exception:
+                self._limits = (PI_WAVE_MAX_PULSES, PI_WAVE_MAX_CBS)
+        return self._limits
+
+    def _pool_used(self):
+        """Control blocks from the bottom of pigpio's pool to its top, deleted waves below the top included."""
+        return sum(self._wave_cbs.values()) + sum(self._deleted_cbs.values())
+
+    def _reserved_cbs(self):
+        """Control blocks up to the highest fragment wave: what stays taken once every frame wave is gone."""
+        if not self._fragments:
+            return 0
+        top = max(self._fragments.values())
+        return (sum(n for wid, n in self._wave_cbs.items() if wid <= top)
+                + sum(n for wid, n in self._deleted_cbs.items() if wid <= top))
+
+    @contextmanager
+    def batch(self):
+        """
+        Frame scope: auto_write shows requested inside the block become a single show() at the end.
+            with multi.batch():
+                for i in range(79):
+                    pixels[3][i] = BLUE
+        Scopes may be nested; the frame goes out when the outermost one exits.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._pending_show:
+                self.show()
+
+    def request_show(self):
+        """Called by auto_write strips: show now, at the end of the current batch, or on the next tick."""
+        if self._batch_depth:
+            self._pending_show = True
+        elif self.auto_write_interval:
+            with self._tick_lock:
+                if self._tick_timer is None:
+                    self._tick_timer = Timer(self.auto_write_interval, self._tick)
+                    self._tick_timer.daemon = True
+                    self._tick_timer.start()
+        else:
+            self.show()
+
+    def _tick(self):
+        with self._tick_lock:
+            self._tick_timer = None
+        self.show()
 
     def show(self):
         """
         Build a pigpio wave combining all strips and send it once.
         This constructs per-bit pulses so each GPIO gets the correct timing for its bit.
+        Only strips that changed are driven, and each stops after its last changed pixel
+        (WS2812 pixels keep their color when no data reaches them); unchanged frames are skipped.
+        Waves are cached by frame hash, so a frame shown recently is resent without rebuilding it.
+        With background=True the frame is queued for the transmitter thread and show() returns at once.
         """
+        self._pending_show = False
+        with self._pixel_lock:
+            if not self._dirty.any():
+                # nothing written since the last frame
+                self.frames_skipped += 1
+                return
+            # cleared together with the snapshot, so a write after it marks the next frame dirty
+            self._dirty[:] = False
+            frame = self._frame_grb()
+        if self._tx_thread is not None:
+            self._enqueue(frame)
+            return
         with self.lock:
-            # delete previous wave
             try:
-                if self._last_wave is not None:
-                    self.pi.wave_delete(self._last_wave)
-            except Exception:
-                pass
-            self._last_wave = None
-
-            max_pixels = max(self.counts)
-            # build bitstreams per strip: MSB-first GRB per LED
-            bitstreams = []
-            for s_idx in range(len(self.pins)):
-                bs = []
-                for i in range(max_pixels):
-                    if i < self.counts[s_idx]:
-                        r,g,b = self.pixels[s_idx][i]
-                        # apply brightness
-                        r = int(r * self.brightness)
-                        g = int(g * self.brightness)
-                        b = int(b * self.brightness)
-                        grb = (g & 0xFF, r & 0xFF, b & 0xFF)
-                    else:
-                        grb = (0,0,0)
-                    for byte in grb:
-                        for bit in range(7, -1, -1):
-                            bs.append(1 if (byte >> bit) & 1 else 0)
-                bitstreams.append(bs)
-
-            total_bits = len(bitstreams[0])
-            pulses = []
-
-            # For efficiency, precompute GPIO bit masks
-            gpio_masks = [1 << pin for pin in self.pins]
-
-            for bit_index in range(total_bits):
-                # determine which pins require '1' for this bit
-                want1_mask = 0
-                for i_pin, mask in enumerate(gpio_masks):
-                    if bitstreams[i_pin][bit_index]:
-                        want1_mask |= mask
-
-                # The sequence for WS2812: set '1' pins high. '0' pins should be high only for T0H_US.
-                # We construct three pulses per bit where needed:
-                # 1) set all '1' pins high (others low) for T0H_US
-                # 2) after T0H_US, clear pins that are '0' (they were never set), keep '1' pins high for (T1H_US - T0H_US)
-                # 3) clear remaining pins and wait T1L_US
-                # Implementation with pigpio.pulse(on_mask, off_mask, delay)
-                # Step 1:
-                if want1_mask:
-                    # set want1 pins high; ensure other pins are low
-                    pulses.append(pigpio.pulse(want1_mask, 0, T0H_US))
-                    if T1H_US > T0H_US:
-                        pulses.append(pigpio.pulse(0,0, T1H_US - T0H_US))
-                    # then clear want1 pins and wait T1L_US
-                    pulses.append(pigpio.pulse(0, want1_mask, T1L_US))
-                else:
-                    # all zeros: no pins high for entire T0H + T0L (we still need timing)
-                    pulses.append(pigpio.pulse(0,0, T0H_US + T0L_US))
-
-            # Reset pulse
-            pulses.append(pigpio.pulse(0,0, RESET_US))
+                self._send_frame(frame)
+                self._wait_idle()
+            except Exception as e:
+                self._send_failed(e)
 
-            # load and send wave
+    def flush(self):
+        """Block until every queued frame has been sent and the last one has left the wire."""
+        if self._queue is not None:
+            self._queue.join()
+        with self.lock:
+            self._wait_idle()
+
+    def close(self):
+        """Send what is still queued, then stop the transmitter thread."""
+        if self._tx_thread is not None:
+            self._queue.put(None)
+            self._tx_thread.join()
+            self._tx_thread = None
+
+    def _enqueue(self, frame):
+        if self.queue_policy == "block":
+            self._queue.put(frame)
+            return
+        while True:
             try:
-                self.pi.wave_clear()
-                self.pi.wave_add_generic(pulses)
-                wid = self.pi.wave_create()
-                if wid >= 0:
-                    self._last_wave = wid
-                    self.pi.wave_send_once(wid)
-                    # wait until finished
-                    while self.pi.wave_tx_busy():
-                        time.sleep(0.001)
-                else:
-                    raise RuntimeError("Failed to create pigpio wave")
-            except Exception as e:
-                print("Error sending wave:", e)
+                self._queue.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _tx_loop(self):
+        """
+        Transmitter thread: the next frame is encoded and uploaded while the current one is
+        still on the wire, then sent as soon as the line is free.
+        """
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    return
+                with self.lock:
+                    try:
+                        self._send_frame(frame)
+                    except Exception as e:
+                        self._send_failed(e)
+            finally:
+                self._queue.task_done()
+
+    def _send_failed(self, error):
+        """
+        A send failed, maybe after part of the frame went out: what the strips show is unknown,
+        so the next frame is sent in full (caller holds the lock).
+        """
+        self._shown = None
+        with self._pixel_lock:
+            self._dirty[:] = True
+        print("Error sending wave:", error)
+
+    def _send_frame(self, frame):
+        """Send the part of frame that differs from what the strips show (caller holds the lock)."""
+        lengths = self._changed_lengths(frame)
+        if not lengths.any():
+            self.frames_skipped += 1
+            return
+        prepared = self._prepare(frame, lengths)
+        self._wait_idle()
+        self._start(prepared)
+        self.frames_sent += 1
+        self._shown = frame
+        self.pixels_sent += int(lengths.sum())
+        self.pulses_sent += self.last_frame_pulses
+
+    def _changed_lengths(self, frame):
+        """Per strip: pixels to send so everything up to the last one that differs from the strip is updated."""
+        if self._shown is None:
+            return np.array(self.counts)
+        diff = np.any(frame != self._shown, axis=2)
+        last = diff.shape[1] - np.argmax(diff[:, ::-1], axis=1)
+        return np.where(diff.any(axis=1), last, 0)
+
+    def _prepare(self, frame, lengths):
+        """
+        Get a frame ready to send: either ("chain", data) of fragment waves or ("waves", ids).
+        Only lengths[s] pixels are sent on strip s; strips with length 0 are not driven at all.
+        Uploads whatever is missing but does not touch what is currently transmitting.
+        """
+        # truncate: zero every pixel past each strip's length, then cut the frame after the longest
+        grb = frame[:, :lengths.max()].copy()
+        grb[np.arange(grb.shape[1])[None, :] >= lengths[:, None]] = 0
+        if self.fragments:
+            chain = self._fragment_chain(grb, lengths)
+            if chain is not None:
+                return ("chain", chain)
+        key = hashlib.blake2b(grb.tobytes() + lengths.tobytes(), digest_size=16).digest()
+        cached = self._waves.get(key)
+        if cached is not None:
+            self._waves.move_to_end(key)
+            self.cache_hits += 1
+            wids, self.last_frame_pulses = cached
+        else:
+            self.cache_misses += 1
+            ones = encode_slot_masks(grb, self.pins)
+            on, off, delay = parallel_pulse_arrays(ones, active_slot_masks(lengths, self.pins, len(ones)),
+                                                   reset=True)
+            self.last_frame_pulses = len(on)
+            cbs = pulse_cbs(on, off, delay)
+            if cbs.sum() > self._wave_limits()[1] - self._reserved_cbs():
+                # more than the whole control-block pool: stream it, nothing to cache
+                return ("stream", (on, off, delay, cbs))
+            wids = self._create_frame_waves(on, off, delay, cbs)
+            self._waves[key] = (wids, self.last_frame_pulses)
+            while len(self._waves) > self.wave_cache_size:
+                if not self._evict_oldest(keep=key):
+                    break
+        return ("waves", wids)
+
+    def _start(self, prepared):
+        kind, data = prepared
+        if kind == "stream":
+            self._stream(*data)
+        elif kind == "chain":
+            self.pi.wave_chain(data)
+            self.chained_frames += 1
+            # fragments are never evicted, nothing to protect
+            self._in_flight = set()
+        elif len(data) == 1:
+            self.pi.wave_send_once(data[0])
+            self._in_flight = set(data)
+        else:
+            # segments play back-to-back with no gap between waves
+            self.pi.wave_chain(list(data))
+            self._in_flight = set(data)
+
+    def _wait_idle(self):
+        # wait until finished
+        while self.pi.wave_tx_busy():
+            time.sleep(0.001)
+        self._in_flight = set()
+        if self._streamed is not None:
+            # last segment of a streamed frame
+            self._delete_wave(self._streamed)
+            self._streamed = None
+
+    def _stream(self, on, off, delay, cbs):
+        """
+        Send a frame that does not fit in pigpio's control-block pool at once: segment k+1 is
+        created while segment k is on the wire and queued behind it with WAVE_MODE_ONE_SHOT_SYNC,
+        and a segment is deleted once wave_tx_at() has moved past it. So two segments share the
+        pool left after the fragments (cached frames are dropped to make room).
+        pigpiod only flags a deleted wave: its slot is reused by a new wave of exactly the same
+        shape (control blocks, and the words holding pin masks), or once every wave above it is
+        gone. Segment k is deleted while k+1 sits above it, so every segment is created with
+        wave_create_and_pad() at the same percentage of the pool and segment k+2 takes over k's slot.
+        If the next segment is not queued before the current one ends, the line idles long
+        enough for the strips to latch half a frame: that is counted as an underrun and raised.
+        """
+        # the caller waited for the line to be idle, so every cached frame can go
+        while self._evict_oldest():
+            pass
+        max_pulses, max_cbs = self._wave_limits()
+        # half of what is left, as a whole percentage of the pool
+        percent = (max_cbs - self._pool_used()) * 50 // max_cbs
+        cb_limit = max_cbs * percent // 100
+        bounds = split_segments(cbs, cb_limit, max_pulses)
+        prev = None
+        for start, end in bounds:
+            wid = self._new_wave(make_pulses(on[start:end], off[start:end], delay[start:end]), cb_limit,
+                                 pad=percent)
+            if prev is not None and self.pi.wave_tx_at() != prev:
+                self.stream_underruns += 1
+                self._delete_wave(wid)
+                self._delete_wave(prev)
+                self._streamed = None
+                self._in_flight = set()
+                raise RuntimeError("stream underrun: segment %d of %d was not ready in time"
+                                   % (bounds.index((start, end)) + 1, len(bounds)))
+            self.pi.wave_send_using_mode(wid, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            if prev is not None:
+                while self.pi.wave_tx_at() == prev:
+                    time.sleep(0.0001)
+                self._delete_wave(prev)
+            prev = wid
+            self._streamed = wid
+            self._in_flight = {wid}
+        self.streamed_frames += 1
+
+    def _fragment_chain(self, grb, lengths):
+        """
+        wave_chain data sending the (truncated) frame as fragment waves.
+        Returns None when the chain would be too long or the fragments do not fit,
+        so the caller can fall back to a whole-frame wave.
+        """
+        if len(self.pins) == 1:
+            symbols = grb.reshape(-1)[:lengths[0] * 3]
+            period = 3
+        else:
+            # one symbol per slot: active pins in the high word, '1' pins in the low word
+            ones = encode_slot_masks(grb, self.pins)
+            active = active_slot_masks(lengths, self.pins, len(ones))
+            symbols = (active.astype(np.uint64) << np.uint64(32)) | ones
+            period = 24
+        if not self._load_fragments(np.unique(symbols).tolist()):
+            return None
+        chain = chain_blocks(symbols.reshape(-1, period), self._fragments)
+        if len(chain) > WAVE_CHAIN_MAX:
+            return None
+        self.last_frame_pulses = sum(self._fragment_sizes[sym] for sym in symbols.tolist())
+        return chain
+
+    def _load_fragments(self, symbols):
+        """
+        Upload fragment waves for any symbols not seen before; they stay loaded until cleanup.
+        pigpio only has MAX_WAVES wave ids (fewer than 256), so fragments are created on first use.
+        A fragment created above frame waves would keep their control blocks from ever coming
+        back (see _delete_wave), so frame waves are dropped first and fragments stay at the
+        bottom of the pool.
+        """
+        budget = MAX_WAVES - self.wave_cache_size
+        for sym in symbols:
+            if sym in self._fragments:
+                continue
+            if len(self._fragments) >= budget:
+                return False
+            if len(self._wave_cbs) + len(self._deleted_cbs) > len(self._fragments):
+                self._wait_idle()
+                while self._evict_oldest():
+                    pass
+            if len(self.pins) == 1:
+                pulses = byte_pulses(sym, 1 << self.pins[0])
+            else:
+                pulses = slot_pulses(sym & 0xFFFFFFFF, sym >> 32)
+            on, off, delay = zip(*((p.gpio_on, p.gpio_off, p.delay) for p in pulses))
+            try:
+                wid = self._new_wave(pulses, int(pulse_cbs(on, off, delay).sum()))
+            except Exception:
+                return False
+            self._fragments[sym] = wid
+            self._fragment_sizes[sym] = len(pulses)
+        return True
+
+    def _create_frame_waves(self, on, off, delay, cbs):
+        """
+        Upload the frame as one or more segment waves (each within pigpio's pulse limit) and
+        return their ids in send order. All of them are loaded at once, so the caller checks the
+        frame fits in the control-block pool.
+        """
+        wids = []
+        try:
+            for start, end in split_segments(cbs, self._wave_limits()[1], self._wave_limits()[0]):
+                wids.append(self._create_wave(make_pulses(on[start:end], off[start:end], delay[start:end]),
+                                              int(cbs[start:end].sum())))
+        except Exception as e:
+            for wid in wids:
+                self._delete_wave(wid)
+            raise RuntimeError("Frame does not fit in pigpio wave memory (%d segment(s) loaded): %s"
+                               % (len(wids), e))
+        return tuple(wids)
+
+    def _new_wave(self, pulses, cbs, pad=None):
+        """
+        Upload pulses as a new wave; raises if pigpio cannot create it.
+        pad: create it with wave_create_and_pad(pad), taking pad percent of the pool (cbs then is that share)
+        """
+        self.pi.wave_add_new()
+        self.pi.wave_add_generic(pulses)
+        wid = self.pi.wave_create() if pad is None else self.pi.wave_create_and_pad(pad)
+        if wid < 0:
+            raise RuntimeError("Failed to create pigpio wave")
+        # a deleted wave of the same shape may have been reused
+        self._deleted_cbs.pop(wid, None)
+        self._wave_cbs[wid] = cbs
+        return wid
+
+    def _delete_wave(self, wid):
+        """
+        Delete a wave. pigpiod only flags it: its control blocks come back once every wave with a
+        higher id is deleted too, or when a new wave of exactly the same shape takes over the id.
+        """
+        try:
+            self.pi.wave_delete(wid)
+        except Exception:
+            return
+        cbs = self._wave_cbs.pop(wid, None)
+        if cbs is None:
+            return
+        self._deleted_cbs[wid] = cbs
+        top = max(self._wave_cbs, default=-1)
+        while self._deleted_cbs and max(self._deleted_cbs) > top:
+            del self._deleted_cbs[max(self._deleted_cbs)]
+
+    def _create_wave(self, pulses, cbs):
+        """
+        Upload pulses as a new wave and return its id.
+        When pigpio's pool has no room, the cached frames highest in it are deleted (the pool only
+        frees from the top) until the wave fits, then it retries.
+        """
+        max_cbs = self._wave_limits()[1]
+        while True:
+            if self._pool_used() + cbs <= max_cbs:
+                try:
+                    return self._new_wave(pulses, cbs)
+                except Exception as e:
+                    # pigpio raises by default
+                    error = e
+            else:
+                error = RuntimeError("pigpio wave memory is full (%d of %d control blocks)"
+                                     % (self._pool_used(), max_cbs))
+            if self._evict_top():
+                continue
+            if self._in_flight:
+                # the only waves left are on the wire; they can go once it finishes
+                self._wait_idle()
+                continue
+            raise error
+
+    def _evict(self, key):
+        wids, _ = self._waves.pop(key)
+        for wid in wids:
+            self._delete_wave(wid)
+
+    def _evict_oldest(self, keep=None):
+        """Delete the least recently shown cached frame that is not transmitting. False if none."""
+        for key, (wids, _) in self._waves.items():
+            if key == keep or self._in_flight.intersection(wids):
+                continue
+            self._evict(key)
+            return True
+        return False
+
+    def _evict_top(self):
+        """Delete the cached frame highest in pigpio's pool that is not transmitting. False if none."""
+        frames = [(max(wids), key) for key, (wids, _) in self._waves.items()
+                  if not self._in_flight.intersection(wids)]
+        if not frames:
+            return False
+        self._evict(max(frames)[1])
+        return True
+
+    def clear_wave_cache(self):
+        """Delete every cached wave from pigpio's wave memory."""
+        with self.lock:
+            self._wait_idle()
+            while self._evict_oldest():
+                pass
 
     def _cleanup(self):
+        with self._tick_lock:
+            if self._tick_timer is not None:
+                self._tick_timer.cancel()
+                self._tick_timer = None
+        self.close()
         try:
-            if self._last_wave is not None:
-                self.pi.wave_delete(self._last_wave)
+            self._wait_idle()
         except Exception:
             pass
+        while self._evict_oldest():
+            pass
+        for wid in self._fragments.values():
+            self._delete_wave(wid)
+        self._fragments.clear()
+        self._fragment_sizes.clear()
         for gpio in self.pins:
             try:
                 self.pi.write(gpio, 0)
@@ -169,17 +823,28 @@ class StripProxy:
         self.length = self._multi.counts[idx]
 
     def __setitem__(self, key, color):
-        # allow setting item or slice not implemented; keep simple
+        # key: index, slice or index array; color: one (r,g,b) or a sequence of them
         self._multi.set_pixel(self._idx, key, color)
         if self.auto_write:
-            self._multi.show()
+            self._multi.request_show()
 
     def __getitem__(self, key):
-        return self._multi.pixels[self._idx][key]
+        selected = self._multi.strip_view(self._idx)[key]
+        if selected.ndim == 1:
+            return tuple(selected.tolist())
+        return [tuple(c) for c in selected.tolist()]
 
     def __len__(self):
         return self.length
 
+    def fill(self, color):
+        self._multi.fill_strip(self._idx, color)
+        if self.auto_write:
+            self._multi.request_show()
+
+    def show(self):
+        self._multi.show()
+
 # -----------------------------
 # === Your original code adapted ===
 # minimal changes: replace neopixel.NeoPixel(...) with StripProxy objects backed by PigpioMulti
@@ -208,25 +873,22 @@ if __name__ == "__main__":
     BLUE = (0, 0, 255)
     OFF = (0, 0, 0)
 
-    # ===== LEVEL 5 =====
-    for i in range(0, 0):  # Pixels 1-49 (0, 48)
-        pixels[4][i] = BLUE
+    # batch() turns the per-pixel auto_write shows below into a single frame
+    with multi.batch():
+        # ===== LEVEL 5 =====
+        pixels[4][0:0] = BLUE  # Pixels 1-49 (0, 48)
 
-    # ===== LEVEL 4 =====
-    for i in range(0, 79):  # Pixels 1-93 (0, 93)
-        pixels[3][i] = BLUE
+        # ===== LEVEL 4 =====
+        pixels[3][0:79] = BLUE  # Pixels 1-93 (0, 93)
 
-    # ===== LEVEL 3 =====
-    for i in range(0, 100):  # Pixels 0-0 (0, 0)
-        pixels[2][i] = BLUE
+        # ===== LEVEL 3 =====
+        pixels[2][0:100] = BLUE  # Pixels 0-0 (0, 0)
 
-    # ===== LEVEL 2 =====
-    for i in range(0, 100):  # Pixels 0-0 (0, 0)
-        pixels[1][i] = BLUE
+        # ===== LEVEL 2 =====
+        pixels[1][0:100] = BLUE  # Pixels 0-0 (0, 0)
 
-    # ===== LEVEL 1 =====
-    for i in range(0, 100):  # Pixels 0-0 (0, 0)
-        pixels[0][i] = BLUE
+        # ===== LEVEL 1 =====
+        pixels[0][0:100] = BLUE  # Pixels 0-0 (0, 0)
 
     # keep script alive briefly so you can see results (adjust or remove as you want)
     time.sleep(1)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# render.py
+# Change-driven LED output: callers say what every strip should show, and commit() only writes
+# and show()s the strips whose pixels actually differ from what was last pushed.
+# Works with anything that looks like a neopixel strip (neopixel.NeoPixel, StripProxy, VirtualStrip).
+#
+#     renderer = StripRenderer(pixels)
+#     renderer.set_segment(0, 0, 60, DARK_BLUE)
+#     renderer.commit()          # writes strip 0 once; the same call again writes nothing
+#     renderer.take_counters()   # {"writes": 1, "avoided": 1, ...}
+
+import numpy as np
+
+class StripRenderer:
+    def __init__(self, strips):
+        self.strips = strips
+        self._wanted = [np.zeros((len(s), 3), dtype=np.uint8) for s in strips]
+        self._pushed = [None] * len(strips)   # unknown until first written
+        self._touched = set()
+        self.writes = 0        # strip show()s sent
+        self.avoided = 0       # strips asked for again with nothing changed
+        self.pixels_written = 0
+
+    def set_segment(self, strip, start, end, color):
+        """Pixels start..end-1 of a strip should show color (not sent until commit)."""
+        self._wanted[strip][start:end] = color[:3]
+        self._touched.add(strip)
+
+    def fill(self, strip, color):
+        self.set_segment(strip, 0, len(self._wanted[strip]), color)
+
+    def color_of(self, strip, index):
+        """Color last pushed for a pixel (None if the strip was never written)."""
+        pushed = self._pushed[strip]
+        return None if pushed is None else tuple(int(c) for c in pushed[index])
+
+    def commit(self, strips=None):
+        """Write and show the strips (default: all touched since the last commit) that changed."""
+        strips = sorted(self._touched) if strips is None else strips
+        sent = 0
+        for i in strips:
+            wanted, pushed = self._wanted[i], self._pushed[i]
+            if pushed is None:
+                changed = np.arange(len(wanted))
+            else:
+                changed = np.flatnonzero((wanted != pushed).any(axis=1))
+            if not len(changed):
+                self.avoided += 1
+                continue
+            # one slice covering the changed pixels
+            start, end = int(changed[0]), int(changed[-1]) + 1
+            self.strips[i][start:end] = [tuple(c) for c in wanted[start:end].tolist()]
+            self.strips[i].show()
+            self._pushed[i] = wanted.copy()
+            self.writes += 1
+            self.pixels_written += end - start
+            sent += 1
+        self._touched.difference_update(strips)
+        return sent
+
+    def forget(self, strip=None):
+        """The strip was written behind our back (e.g. fill() at shutdown): push it next time."""
+        for i in range(len(self.strips)) if strip is None else [strip]:
+            self._pushed[i] = None
+
+    def take_counters(self):
+        """Counters since the last call, then reset them."""
+        counters = {"writes": self.writes, "avoided": self.avoided, "pixels": self.pixels_written}
+        self.writes = self.avoided = self.pixels_written = 0
+        return counters
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# scenario.py
+# Scenario timelines for the terrace water model: a JSON file of timed events that flips the
+# heavy rain / Level 4 blockage triggers and changes rates while the simulation runs, so demos and
+# regression runs are reproducible without editing case1.py.
+#
+#     {
+#       "name": "storm with blockage",
+#       "duration": 1800,
+#       "parameters": {"heavy_rain_rate": 12.0},
+#       "events": [
+#         {"from": 120, "to": 900, "heavy_rain": true},
+#         {"t": 300, "level_4_blocked": true},
+#         {"t": 1200, "flow_rates": {"3": 1.0}}
+#       ]
+#     }
+#
+# Event fields: heavy_rain, level_4_blocked (true/false), spring_rate (L/s, null to go back to the
+# rain-driven rate), flow_rates ({level number: L/s}), or any entry of PARAMETERS except the
+# capacities and starting levels. "t" applies the change from then on; "from"/"to" applies it for a
+# span and then restores what was in effect before, for the fields and levels the span set and that
+# no later event has set since.
+#
+# Headless replay (unthrottled unless --speed is given), recording status as JSON lines and every
+# tick to a time series column store (colstore.py):
+#     python3 scenario.py scenarios/storm_blockage.json --record status.jsonl --ticks runs/storm
+# With LEDs: CPS_SCENARIO=scenarios/storm_blockage.json CPS_SIM_SPEED=30 python3 case1.py
+
+import argparse
+import bisect
+import json
+import time
+
+import numpy as np
+
+from colstore import ColumnWriter
+from water_sim import SimulationRunner, TerraceSimulator
+
+# Defaults: case1.py's constants (levels listed Level 1 → Level 5)
+PARAMETERS = {
+    "normal_spring_rate": 3.0,
+    "heavy_rain_rate": 10.0,
+    "level_4_normal_flow": 2.0,
+    "level_4_blocked_flow": 0.3,
+    "capacities": [400, 300, 250, 200, 150],
+    "flow_rates": [4.0, 3.0, 2.5, 2.0, 1.5],
+    "initial_levels": [200.0, 150.0, 125.0, 100.0, 75.0],
+}
+LEVEL_4 = 3
+FIXED = ("capacities", "initial_levels")
+
+def _get_entry(conditions, entry):
+    if isinstance(entry, tuple):
+        return conditions["flow_rates"][entry[1]]
+    return conditions[entry]
+
+def _set_entry(conditions, entry, value):
+    if isinstance(entry, tuple):
+        conditions["flow_rates"] = list(conditions["flow_rates"])
+        conditions["flow_rates"][entry[1]] = value
+    else:
+        conditions[entry] = value
+
+def status_name(pct):
+    """Status bands of case1.py's status table"""
+    if pct < 50:
+        return "DROUGHT"
+    elif pct < 75:
+        return "NORMAL"
+    elif pct <= 100:
+        return "FULL"
+    return "FLOOD"
+
+class Scenario:
+    def __init__(self, events, duration, parameters=None, name="", dt=1.0, defaults=None):
+        self.name = name
+        self.duration = float(duration)
+        self.dt = float(dt)
+        self.parameters = dict(defaults or PARAMETERS)
+        for key, value in (parameters or {}).items():
+            if key not in self.parameters:
+                raise ValueError(f"unknown parameter {key!r}")
+            self.parameters[key] = value
+        self.events = events
+        self._times, self._states = self._compile(events)
+
+    def initial_conditions(self):
+        p = self.parameters
+        return {
+            "heavy_rain": False,
+            "level_4_blocked": False,
+            "spring_rate": None,
+            "normal_spring_rate": p["normal_spring_rate"],
+            "heavy_rain_rate": p["heavy_rain_rate"],
+            "level_4_normal_flow": p["level_4_normal_flow"],
+            "level_4_blocked_flow": p["level_4_blocked_flow"],
+            "flow_rates": list(p["flow_rates"]),
+        }
+
+    def _compile(self, events):
+        """Conditions in effect after every event time, for bisect lookups."""
+        changes = []  # (time, order, writes, kind): kind is "t", "from" or "to" (writes None)
+        for order, event in enumerate(events):
+            event = dict(event)
+            if "t" in event:
+                start, end = event.pop("t"), None
+            elif "from" in event:
+                start, end = event.pop("from"), event.pop("to", None)
+            else:
+                raise ValueError(f"event {order} has no 't' or 'from'")
+            for key in event:
+                if key in FIXED or key not in self.initial_conditions():
+                    raise ValueError(f"event {order}: cannot change {key!r}")
+            changes.append((float(start), order, self._writes(event), "t" if end is None else "from"))
+            if end is not None:
+                changes.append((float(end), order, None, "to"))
+        changes.sort(key=lambda c: (c[0], c[1]))
+
+        # A span restores only the entries (scalar keys, single levels' flow rates) it set, and
+        # only while it is still the last event that set them: a later event's value stays.
+        conditions = self.initial_conditions()
+        spans = {}   # event order -> {entry: (value, setter) before the span set it}, while in effect
+        setter = {}  # entry -> order of the span that set it last, None for a "t" event
+        times, states = [0.0], [dict(conditions, flow_rates=list(conditions["flow_rates"]))]
+        for t, order, writes, kind in changes:
+            if kind == "to":
+                for entry, (value, previous) in spans.pop(order).items():
+                    if setter.get(entry) == order:
+                        _set_entry(conditions, entry, value)
+                        setter[entry] = previous
+                        continue
+                    # a later span saved this one's value: hand it what was there before instead
+                    for saved in spans.values():
+                        if entry in saved and saved[entry][1] == order:
+                            saved[entry] = (value, previous)
+            else:
+                span = spans.setdefault(order, {}) if kind == "from" else None
+                for entry, value in writes:
+                    if span is not None:
+                        span.setdefault(entry, (_get_entry(conditions, entry), setter.get(entry)))
+                    _set_entry(conditions, entry, value)
+                    setter[entry] = order if span is not None else None
+            state = dict(conditions, flow_rates=list(conditions["flow_rates"]))
+            if times[-1] == t:
+                states[-1] = state
+            else:
+                times.append(t)
+                states.append(state)
+        return times, states
+
+    @staticmethod
+    def _writes(event):
+        """(entry, value) pairs an event sets; an entry is a condition key or ("flow_rates", level index)."""
+        writes = []
+        for key, value in event.items():
+            if key == "flow_rates":
+                for level, rate in value.items():
+                    writes.append((("flow_rates", int(level) - 1), float(rate)))
+                    if int(level) - 1 == LEVEL_4:
+                        writes.append(("level_4_normal_flow", float(rate)))
+            else:
+                writes.append((key, value))
+        return writes
+
+    def change_times(self):
+        """Simulated times at which the conditions change"""
+        return list(self._times)
+
+    def conditions_at(self, t):
+        return self._states[bisect.bisect_right(self._times, t) - 1]
+
+    def rates_at(self, t):
+        """(spring rate, per-level flow rates) in effect at simulated time t"""
+        c = self.conditions_at(t)
+        spring = c["spring_rate"]
+        if spring is None:
+            spring = c["heavy_rain_rate"] if c["heavy_rain"] else c["normal_spring_rate"]
+        rates = list(c["flow_rates"])
+        rates[LEVEL_4] = c["level_4_blocked_flow"] if c["level_4_blocked"] else c["level_4_normal_flow"]
+        return spring, rates
+
+    def apply(self, sim):
+        """Set the simulator's rates for its current time; returns the conditions applied."""
+        spring, rates = self.rates_at(sim.time)
+        sim.spring_rate[:] = spring
+        sim.flow_rates[:] = rates
+        return self.conditions_at(sim.time)
+
+    def make_simulator(self):
+        p = self.parameters
+        sim = TerraceSimulator(p["capacities"], p["flow_rates"], p["initial_levels"], p["normal_spring_rate"])
+        self.apply(sim)
+        return sim
+
+def load_scenario(path, defaults=None):
+    with open(path) as f:
+        data = json.load(f)
+    return Scenario(data.get("events", []), data["duration"], data.get("parameters"),
+                    name=data.get("name", path), dt=data.get("dt", 1.0), defaults=defaults)
+
+class StatusRecorder:
+    """Writes the simulation status as JSON lines, once every `every` simulated seconds."""
+    def __init__(self, path, every=1.0):
+        self._file = open(path, "w")
+        self.every = every
+        self._next = 0.0
+        self.records = 0
+
+    @property
+    def next_time(self):
+        """Simulated time from which the next record is written."""
+        return self._next
+
+    def record(self, sim, conditions):
+        if sim.time < self._next:
+            return
+        self._next = sim.time + self.every
+        pct = sim.percentages()[0]
+        self._file.write(json.dumps({
+            "t": sim.time,
+            "levels": [round(float(l), 3) for l in sim.levels[0]],
+            "pct": [round(float(p), 2) for p in pct],
+            "status": [status_name(p) for p in pct],
+            "heavy_rain": bool(conditions["heavy_rain"]),
+            "level_4_blocked": bool(conditions["level_4_blocked"]),
+            "spring_rate": float(sim.spring_rate[0]),
+            "flow_rates": [float(r) for r in sim.flow_rates[0]],
+        }) + "\n")
+        self.records += 1
+
+    def close(self):
+        self._file.close()
+
+def tick_columns(terraces):
+    return [
+        ("time", "<f8"),                        # simulated seconds
+        ("levels", "<f4", (terraces,)),         # litres
+        ("flow_rates", "<f4", (terraces,)),
+        ("spring_rate", "<f4"),
+        ("heavy_rain", "u1"),
+        ("level_4_blocked", "u1"),
+        ("colors", "u1", (terraces, 3)),        # LED color chosen for each level
+    ]
+
+class TickRecorder:
+    """
+    Appends the state at every tick to a time series column store (see colstore.py), so long runs
+    can be range-queried and downsampled later. Rows are buffered and written every `flush_every`.
+    An existing store with rows is refused unless overwrite=True (or append=True, for a run that
+    continues its timeline: the times must keep ascending for queries).
+    """
+    def __init__(self, path, terraces=5, flush_every=256, append=False, overwrite=False, meta=None):
+        self.store = ColumnWriter(path, tick_columns(terraces), meta, append=append, overwrite=overwrite)
+        self._rows = {name: np.zeros((flush_every,) + shape, dtype=dtype)
+                      for name, dtype, shape in self.store.columns}
+        self._count = 0
+
+    def record(self, sim, conditions, colors=None):
+        i = self._count
+        rows = self._rows
+        rows["time"][i] = sim.time
+        rows["levels"][i] = sim.levels[0]
+        rows["flow_rates"][i] = sim.flow_rates[0]
+        rows["spring_rate"][i] = sim.spring_rate[0]
+        rows["heavy_rain"][i] = bool(conditions["heavy_rain"])
+        rows["level_4_blocked"][i] = bool(conditions["level_4_blocked"])
+        rows["colors"][i] = 0 if colors is None else colors
+        self._count += 1
+        if self._count == len(rows["time"]):
+            self.flush()
+
+    def flush(self):
+        if self._count:
+            self.store.append({name: block[:self._count] for name, block in self._rows.items()})
+            self._count = 0
+        self.store.flush()
+
+    def close(self):
+        self.flush()
+        self.store.close()
+
+def replay(scenario, speed=None, recorder=None, adaptive=False, ticks=None):
+    """
+    Run a scenario headless to its duration. speed=None steps as fast as possible in this thread;
+    a number runs it on a SimulationRunner at that many simulated seconds per real second.
+    adaptive (unthrottled only) uses TerraceSimulator.advance() between timeline changes and
+    status records instead of fixed dt steps.
+    ticks: a TickRecorder that gets the state before every step
+    Returns the simulator and the first time each level went above capacity (None if never).
+    An exception that stopped the SimulationRunner is raised again here.
+    """
+    sim = scenario.make_simulator()
+    first_flood = [None] * sim.terraces
+
+    def before_step(sim):
+        conditions = scenario.apply(sim)
+        if recorder is not None:
+            recorder.record(sim, conditions)
+        if ticks is not None:
+            ticks.record(sim, conditions)
+        for i, pct in enumerate(sim.percentages()[0]):
+            if first_flood[i] is None and pct > 100:
+                first_flood[i] = sim.time
+
+    steps = int(round(scenario.duration / scenario.dt))
+    if speed is None and adaptive:
+        changes = scenario.change_times()
+        step_start = [sim.time]
+
+        def after_step(sim):
+            # adaptive steps end on capacity crossings, so a flood began where its step began
+            for i, pct in enumerate(sim.percentages()[0]):
+                if first_flood[i] is None and pct > 100:
+                    first_flood[i] = step_start[0]
+            step_start[0] = sim.time
+
+        while scenario.duration - sim.time > 1e-9:
+            before_step(sim)
+            until = min([t for t in changes if t > sim.time + 1e-9] + [scenario.duration])
+            if recorder is not None:
+                until = min(until, max(recorder.next_time, sim.time + 1e-6))
+            step_start[0] = sim.time
+            sim.advance(until - sim.time, adaptive=True, callback=after_step)
+    elif speed is None:
+        for _ in range(steps):
+            before_step(sim)
+            sim.step(scenario.dt)
+    else:
+        runner = SimulationRunner(sim, scenario.dt, speed, before_step, scenario.duration).start()
+        while runner.running:
+            time.sleep(0.1)
+        if runner.error is not None:
+            # the runner thread stopped early: the replay did not reach the duration
+            raise runner.error
+    if recorder is not None:
+        recorder.record(sim, scenario.conditions_at(sim.time))
+    return sim, first_flood
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a scenario timeline without LEDs")
+    parser.add_argument("scenario")
+    parser.add_argument("--speed", type=float, default=None, help="simulated seconds per real second (default: unthrottled)")
+    parser.add_argument("--record", help="write status JSON lines here")
+    parser.add_argument("--every", type=float, default=1.0, help="simulated seconds between status records")
+    parser.add_argument("--ticks", help="append every tick to a time series column store in this directory")
+    parser.add_argument("--overwrite", action="store_true", help="replace an existing --ticks store")
+    parser.add_argument("--adaptive", action="store_true", help="adaptive sub-stepping instead of fixed dt steps")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario)
+    recorder = StatusRecorder(args.record, args.every) if args.record else None
+    ticks = TickRecorder(args.ticks, overwrite=args.overwrite, meta={"scenario": scenario.name}) if args.ticks else None
+    start = time.perf_counter()
+    sim, first_flood = replay(scenario, args.speed, recorder, args.adaptive, ticks)
+    elapsed = time.perf_counter() - start
+    if recorder is not None:
+        recorder.close()
+    if ticks is not None:
+        ticks.close()
+
+    print(f"{scenario.name}: {scenario.duration:.0f} s simulated in {elapsed:.2f} s")
+    for i, pct in enumerate(sim.percentages()[0]):
+        flood = "never" if first_flood[i] is None else f"{first_flood[i]:.0f} s"
+        print(f"Level {i + 1}: {sim.levels[0, i]:7.1f}L ({pct:6.1f}%) {status_name(pct):8} | first flood: {flood}")
+
+if __name__ == "__main__":
+    main()
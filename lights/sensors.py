@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# sensors.py
+# DHT22 sampling on its own thread, so whatever drives the LEDs never waits on the sensor.
+# A DHT22 read blocks for a few hundred ms, fails now and then with RuntimeError, and the sensor
+# must not be read more often than every 2 seconds. DHTSampler reads it at that rate, backs off
+# exponentially while reads keep failing, and keeps timestamped readings in a ring buffer; the
+# render loop asks for the latest filtered value, which never blocks.
+#
+#     sampler = DHTSampler(adafruit_dht.DHT22(board.D4)).start()
+#     reading = sampler.latest()        # None until the first good read
+#     reading.humidity                  # median of the last few readings
+#     sampler.age(reading)              # seconds since the newest of them
+#     sampler.stop()
+#
+# Several sensors (one or more per terrace) share a small worker pool through SensorScheduler:
+#     scheduler = SensorScheduler([(0, DHT22(board.D4)), (1, DHT22(board.D5))], workers=2).start()
+#     scheduler.table(5)                # per-terrace readings, with their age and a stale flag
+#
+# Both take a clock (default time.monotonic) for their timestamps. Under a virtual clock that only
+# moves when the program sleeps, skip start() and call poll() from the main loop instead: it does
+# the reads that are due on the calling thread.
+
+import heapq
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Event, Lock, Thread
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+MIN_INTERVAL = 2.0     # DHT22: at most one read every 2 seconds
+MAX_BACKOFF = 30.0     # longest wait between retries while reads keep failing
+
+READING_DTYPE = np.dtype([("time", "<f8"), ("temperature", "<f4"), ("humidity", "<f4")])
+
+class Reading(namedtuple("Reading", "time temperature humidity samples")):
+    """A (filtered) reading; time is the sampler's clock() at the newest sample it uses."""
+
+class DHTSampler:
+    """
+    Reads a DHT sensor every `interval` seconds on a background thread.
+    size: readings kept in the ring buffer
+    window: how many recent readings latest() filters over
+    filter: "median" of the window, "ema" (exponential moving average, weight alpha), or None for the raw newest reading
+    clock: function returning the current time in seconds, for timestamps and read spacing
+    """
+    def __init__(self, device, interval=MIN_INTERVAL, size=256, window=5, filter="median", alpha=0.3,
+                 max_backoff=MAX_BACKOFF, clock=time.monotonic):
+        if filter not in ("median", "ema", None):
+            raise ValueError(f"unknown filter {filter!r}")
+        self.device = device
+        self.interval = max(interval, MIN_INTERVAL)
+        self.window = window
+        self.filter = filter
+        self.alpha = alpha
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self._next = None           # clock() at which poll() reads next
+        self._buffer = np.zeros(size, dtype=READING_DTYPE)
+        self._count = 0             # readings ever stored; the newest is at (_count - 1) % size
+        self._ema = None
+        self.reads = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def retry_delay(self):
+        """Wait before the next read: interval, doubled for every failure in a row, up to max_backoff"""
+        if not self.consecutive_failures:
+            return self.interval
+        return min(self.max_backoff, self.interval * 2 ** (self.consecutive_failures - 1))
+
+    def sample(self):
+        """One read attempt; True if it produced a reading."""
+        self.reads += 1
+        try:
+            temperature = self.device.temperature
+            humidity = self.device.humidity
+        except RuntimeError as e:
+            # DHT sensors sometimes time out or fail the checksum; try again later
+            return self._failed(str(e))
+        if temperature is None or humidity is None:
+            return self._failed("no data")
+        self.consecutive_failures = 0
+        self.add(self.clock(), temperature, humidity)
+        return True
+
+    def _failed(self, error):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.last_error = error
+        return False
+
+    def _sample_logged(self):
+        """sample(), but any other error is logged and counted as a failed read instead of raised"""
+        try:
+            return self.sample()
+        except Exception as e:
+            log.exception("reading %r failed", self.device)
+            return self._failed(f"{type(e).__name__}: {e}")
+
+    def add(self, t, temperature, humidity):
+        with self._lock:
+            self._buffer[self._count % len(self._buffer)] = (t, temperature, humidity)
+            self._count += 1
+            if self._ema is None:
+                self._ema = (float(temperature), float(humidity))
+            else:
+                a = self.alpha
+                self._ema = (a * temperature + (1 - a) * self._ema[0], a * humidity + (1 - a) * self._ema[1])
+
+    def poll(self):
+        """Read now if the next read is due (instead of start()); True if it produced a reading."""
+        started = self.clock()
+        if self._next is not None and started < self._next:
+            return False
+        ok = self._sample_logged()
+        self._next = started + self.retry_delay()
+        return ok
+
+    def age(self, reading):
+        """Seconds since the newest sample of a reading, on this sampler's clock"""
+        return self.clock() - reading.time
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = self.clock()
+            self._sample_logged()
+            # read-to-read spacing, however long the read itself took
+            self._stop.wait(max(0.0, self.retry_delay() - (self.clock() - started)))
+
+    def readings(self, last=None):
+        """Stored readings, oldest first (a copy); last=n keeps only the newest n."""
+        with self._lock:
+            size = len(self._buffer)
+            count = min(self._count, size)
+            if last is not None:
+                count = min(count, last)
+            index = (self._count - count + np.arange(count)) % size
+            return self._buffer[index]
+
+    def latest(self):
+        """The filtered value of the most recent readings, or None before the first good read."""
+        with self._lock:
+            if not self._count:
+                return None
+            newest = self._buffer[(self._count - 1) % len(self._buffer)].copy()
+            if self.filter == "ema":
+                return Reading(float(newest["time"]), self._ema[0], self._ema[1], self._count)
+        if self.filter is None:
+            return Reading(float(newest["time"]), float(newest["temperature"]), float(newest["humidity"]), 1)
+        recent = self.readings(self.window)
+        return Reading(float(recent["time"][-1]), float(np.median(recent["temperature"])),
+                       float(np.median(recent["humidity"])), len(recent))
+
+class TerraceReading(namedtuple("TerraceReading", "terrace temperature humidity time age sensors stale")):
+    """Mean of the filtered readings of a terrace's sensors; stale if none read lately."""
+
+class SensorScheduler:
+    """
+    Reads many DHT sensors from a small worker pool, each no more often than its interval.
+    sensors: list of (terrace index, device); a terrace can have several sensors
+    workers: threads doing the blocking reads (each read holds one for a few hundred ms)
+    stale_after: seconds without a good read before a terrace's reading counts as stale
+    clock: function returning the current time in seconds, shared by all the samplers
+    Reads are staggered over the interval so they do not all land at once, and a sensor is only
+    queued again once its last read finished, so it is never polled faster than its interval
+    (or its backoff, while it fails).
+    """
+    def __init__(self, sensors, workers=2, interval=MIN_INTERVAL, stale_after=None, clock=time.monotonic,
+                 **sampler_options):
+        self.terraces = [terrace for terrace, _ in sensors]
+        self.samplers = [DHTSampler(device, interval, clock=clock, **sampler_options) for _, device in sensors]
+        self.clock = clock
+        self.workers = workers
+        self.stale_after = 3 * interval if stale_after is None else stale_after
+        self._queue = []            # heap of (due time, sensor index)
+        self._wake = Condition()
+        self._stop = Event()
+        self._thread = None
+        self._pool = None
+        self.started = None
+
+    def _schedule(self):
+        now = self.clock()
+        count = len(self.samplers)
+        self._queue = [(now + i * sampler.interval / count, i) for i, sampler in enumerate(self.samplers)]
+        heapq.heapify(self._queue)
+        self.started = now
+
+    def start(self):
+        self._schedule()
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="sensor")
+        self._thread = Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._wake:
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def poll(self):
+        """Do the reads that are due on the calling thread (instead of start()); returns how many."""
+        if self.started is None:
+            self._schedule()
+        due = 0
+        while self._queue and self._queue[0][0] <= self.clock():
+            _, index = heapq.heappop(self._queue)
+            self._read(index)
+            due += 1
+        return due
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            with self._wake:
+                wait = self._queue[0][0] - self.clock() if self._queue else None
+                if wait is None or wait > 0:
+                    self._wake.wait(wait)
+                    continue
+                _, index = heapq.heappop(self._queue)
+            self._pool.submit(self._read, index)
+
+    def _read(self, index):
+        sampler = self.samplers[index]
+        started = self.clock()
+        try:
+            sampler._sample_logged()
+        finally:
+            # whatever happened, the sensor stays on the schedule
+            with self._wake:
+                heapq.heappush(self._queue, (started + sampler.retry_delay(), index))
+                self._wake.notify()
+
+    def table(self, terraces=None):
+        """Per-terrace readings (None for a terrace with no sensor or no good read yet)."""
+        terraces = max(self.terraces) + 1 if terraces is None else terraces
+        latest = [[] for _ in range(terraces)]
+        for terrace, sampler in zip(self.terraces, self.samplers):
+            reading = sampler.latest()
+            if reading is not None and terrace < terraces:
+                latest[terrace].append(reading)
+        now = self.clock()
+        rows = []
+        for terrace, readings in enumerate(latest):
+            if not readings:
+                rows.append(None)
+                continue
+            newest = max(r.time for r in readings)
+            rows.append(TerraceReading(terrace, sum(r.temperature for r in readings) / len(readings),
+                                       sum(r.humidity for r in readings) / len(readings),
+                                       newest, now - newest, len(readings), now - newest > self.stale_after))
+        return rows
+
+    def combined(self, table=None):
+        """One Reading over all terraces with fresh readings (None if there are none)."""
+        fresh = [row for row in (self.table() if table is None else table) if row is not None and not row.stale]
+        if not fresh:
+            return None
+        return Reading(max(row.time for row in fresh), sum(row.temperature for row in fresh) / len(fresh),
+                       sum(row.humidity for row in fresh) / len(fresh), len(fresh))
+
+    @property
+    def reads(self):
+        return sum(s.reads for s in self.samplers)
+
+    @property
+    def failures(self):
+        return sum(s.failures for s in self.samplers)
+
+    def samples_per_second(self):
+        """Good reads per second since start()"""
+        elapsed = self.clock() - self.started if self.started else 0.0
+        return (self.reads - self.failures) / elapsed if elapsed > 0 else 0.0
+
+if __name__ == "__main__":
+    # Scheduler throughput with simulated sensors: python3 sensors.py [seconds]
+    import sys
+    from virtual_strip import Pin, SimulatedDHT
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+    for count in (1, 5, 10):
+        workers = max(1, count // 3)
+        scheduler = SensorScheduler([(i % 5, SimulatedDHT(Pin(100 + i))) for i in range(count)], workers).start()
+        time.sleep(seconds)
+        rate = scheduler.samples_per_second()
+        table = scheduler.table(5)
+        scheduler.stop()
+        fresh = sum(row is not None and not row.stale for row in table)
+        print(f"{count:3d} sensors, {workers} workers: {rate:5.2f} samples/s "
+              f"({scheduler.reads} reads, {scheduler.failures} failed), {fresh}/5 terraces fresh")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# sweep.py
+# Monte Carlo sweep of the terrace water model: instead of hand-editing the "MODIFY THIS" constants
+# in case1.py, sample them, run every sample for hours of simulated time and collect per terrace
+# whether it flooded, how high it got and when it first overflowed.
+#
+# Samples run in batches of TerraceSimulator scenarios, one batch per worker process at a time.
+# Every finished batch is appended to a column store (colstore.py) as it arrives:
+#     python3 sweep.py --samples 20000 --hours 6 --output runs/sweep1
+#     python3 sweep.py --samples 2000 --hours 1 --workers 1 --rain-probability 1
+
+import argparse
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from colstore import ColumnWriter, read_columns
+from water_sim import TerraceSimulator
+
+# case1.py's values
+CAPACITIES = [400, 300, 250, 200, 150]
+FLOW_RATES = [4.0, 3.0, 2.5, 2.0, 1.5]
+LEVEL_4 = 3
+
+# Sampled ranges (uniform low, high) around case1.py's constants
+RANGES = {
+    "normal_spring_rate": (2.0, 4.0),       # NORMAL_SPRING_RATE = 3.0
+    "heavy_rain_rate": (6.0, 14.0),         # HEAVY_RAIN_RATE = 10.0
+    "level_4_blocked_flow": (0.1, 0.6),     # LEVEL_4_BLOCKED_FLOW = 0.3
+    "capacity_scale": (0.8, 1.2),           # per terrace, times water_capacities
+    "initial_fraction": (0.3, 0.7),         # per terrace, starting level as a fraction of capacity
+}
+
+TERRACES = len(CAPACITIES)
+
+COLUMNS = [
+    ("sample", "<u4"),
+    ("heavy_rain", "u1"),
+    ("level_4_blocked", "u1"),
+    ("spring_rate", "<f4"),                 # the rate in effect (heavy rain or normal)
+    ("level_4_flow", "<f4"),
+    ("capacities", "<f4", (TERRACES,)),
+    ("initial_levels", "<f4", (TERRACES,)),
+    ("peak_pct", "<f4", (TERRACES,)),
+    ("final_pct", "<f4", (TERRACES,)),
+    ("overflow_s", "<f4", (TERRACES,)),     # first second above capacity; NaN if it never was
+]
+
+def sample_parameters(rng, count, rain_probability, block_probability):
+    """Parameters for count samples; each sample draws its rain and blockage flags too."""
+    def uniform(name, size=None):
+        low, high = RANGES[name]
+        return rng.uniform(low, high, size)
+
+    heavy_rain = rng.random(count) < rain_probability
+    blocked = rng.random(count) < block_probability
+    normal = uniform("normal_spring_rate", count)
+    heavy = uniform("heavy_rain_rate", count)
+    blocked_flow = uniform("level_4_blocked_flow", count)
+    capacities = np.asarray(CAPACITIES) * uniform("capacity_scale", (count, TERRACES))
+    flow_rates = np.tile(FLOW_RATES, (count, 1))
+    flow_rates[:, LEVEL_4] = np.where(blocked, blocked_flow, FLOW_RATES[LEVEL_4])
+    return {
+        "heavy_rain": heavy_rain,
+        "level_4_blocked": blocked,
+        "spring_rate": np.where(heavy_rain, heavy, normal),
+        "capacities": capacities,
+        "flow_rates": flow_rates,
+        "initial_levels": capacities * uniform("initial_fraction", (count, TERRACES)),
+    }
+
+def run_batch(job):
+    """Simulate one batch of samples; job = (seed, batch index, first sample id, count, seconds, ...)"""
+    seed, index, first, count, seconds, rain_probability, block_probability = job
+    # one stream per batch, so results do not depend on how batches are spread over workers
+    rng = np.random.default_rng([seed, index])
+    params = sample_parameters(rng, count, rain_probability, block_probability)
+    sim = TerraceSimulator(params["capacities"], params["flow_rates"], params["initial_levels"],
+                           params["spring_rate"])
+    peak = sim.levels.copy()
+    overflow = np.full(sim.levels.shape, np.inf)
+    over = overflow.copy()
+    for t in range(int(seconds)):
+        levels = sim.step(1.0)
+        np.maximum(peak, levels, out=peak)
+        np.copyto(over, t + 1.0, where=levels > sim.capacities)
+        np.minimum(overflow, over, out=overflow)
+
+    overflow[np.isinf(overflow)] = np.nan
+    return {
+        "sample": np.arange(first, first + count),
+        "heavy_rain": params["heavy_rain"],
+        "level_4_blocked": params["level_4_blocked"],
+        "spring_rate": params["spring_rate"],
+        "level_4_flow": params["flow_rates"][:, LEVEL_4],
+        "capacities": params["capacities"],
+        "initial_levels": params["initial_levels"],
+        "peak_pct": peak / sim.capacities * 100,
+        "final_pct": sim.percentages(),
+        "overflow_s": overflow,
+    }
+
+def summarize(path):
+    """Per-terrace flood probability, peak level and time to overflow, read back from the store."""
+    cols = read_columns(path, ["peak_pct", "overflow_s"])
+    peak = np.asarray(cols["peak_pct"])
+    overflow = np.asarray(cols["overflow_s"])
+    flooded = ~np.isnan(overflow)
+    summary = []
+    for i in range(TERRACES):
+        times = overflow[flooded[:, i], i]
+        summary.append({
+            "level": i + 1,
+            "flood_probability": float(flooded[:, i].mean()) if len(peak) else 0.0,
+            "peak_pct_mean": float(peak[:, i].mean()) if len(peak) else 0.0,
+            "peak_pct_p95": float(np.percentile(peak[:, i], 95)) if len(peak) else 0.0,
+            "overflow_s_median": float(np.median(times)) if len(times) else None,
+            "overflow_s_p05": float(np.percentile(times, 5)) if len(times) else None,
+        })
+    return summary
+
+def sweep(output, samples, hours, workers=None, batch=1024, seed=0, rain_probability=0.3,
+          block_probability=0.3, progress=None, overwrite=False):
+    jobs = []
+    for index, first in enumerate(range(0, samples, batch)):
+        jobs.append((seed, index, first, min(batch, samples - first), hours * 3600,
+                     rain_probability, block_probability))
+    meta = {"samples": samples, "hours": hours, "seed": seed, "batch": batch, "ranges": RANGES,
+            "rain_probability": rain_probability, "block_probability": block_probability}
+    with ColumnWriter(output, COLUMNS, meta, overwrite=overwrite) as store:
+        with Pool(workers) as pool:
+            for result in pool.imap_unordered(run_batch, jobs):
+                store.append(result)
+                store.flush()
+                if progress:
+                    progress(store.rows, samples)
+        store.meta["summary"] = summarize(output)
+    return store.meta["summary"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep of the terrace water model")
+    parser.add_argument("--samples", type=int, default=4096)
+    parser.add_argument("--hours", type=float, default=1.0, help="simulated hours per sample")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--batch", type=int, default=1024, help="samples per batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rain-probability", type=float, default=0.3)
+    parser.add_argument("--block-probability", type=float, default=0.3)
+    parser.add_argument("--output", default="sweep_results")
+    parser.add_argument("--overwrite", action="store_true", help="replace the results already in --output")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    summary = sweep(args.output, args.samples, args.hours, args.workers, args.batch, args.seed,
+                    args.rain_probability, args.block_probability,
+                    progress=lambda done, total: print(f"{done}/{total} samples", end="\r", flush=True),
+                    overwrite=args.overwrite)
+    elapsed = time.perf_counter() - start
+    print()
+    print(f"{args.samples} samples x {args.hours} h in {elapsed:.1f} s -> {args.output}/")
+    for row in summary:
+        median = row["overflow_s_median"]
+        print(f"Level {row['level']}: flood {row['flood_probability'] * 100:5.1f}% | "
+              f"peak mean {row['peak_pct_mean']:7.1f}% p95 {row['peak_pct_p95']:7.1f}% | "
+              f"overflow median {'-' if median is None else f'{median:.0f} s'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# telemetry.py
+# Structured LED/water events without a print() per blink. record() only stores a fixed-width
+# record in a preallocated ring buffer; a background thread drains it to a log file (JSON lines,
+# or raw records if the path ends in .bin) and, if asked, prints a rate-limited one-line view.
+# Longer reports (status tables and the like) go to the same view as notes; without a console
+# view they are dropped.
+#
+#     telemetry = Telemetry("run.jsonl", console_every=5.0, color_names=COLOR_NAMES).start()
+#     telemetry.record("blink_on", level_index, pct, color, "NORMAL", sim_time=sim.time)
+#     telemetry.note("status", table_text)   # printed under the next console line
+#     telemetry.close()
+#     python3 telemetry.py run.bin      # event counts of a log
+
+import json
+import sys
+import time
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+KINDS = ("status", "steady", "blink_off", "blink_on", "blocked_on", "blocked_off")
+STATUSES = ("DROUGHT", "NORMAL", "FULL", "FLOOD")
+
+EVENT_DTYPE = np.dtype([
+    ("time", "<f8"),          # seconds since the telemetry started
+    ("sim_time", "<f8"),      # simulated seconds
+    ("kind", "u1"),           # index into KINDS
+    ("level", "u1"),          # level index (0 = Level 1)
+    ("pct", "<f4"),           # water percentage of capacity
+    ("color", "u1", (3,)),
+    ("status", "u1"),         # index into STATUSES
+    ("blocked", "u1"),
+])
+
+_KIND = {k: i for i, k in enumerate(KINDS)}
+_STATUS = {s: i for i, s in enumerate(STATUSES)}
+
+class Telemetry:
+    """
+    path: log file (None: keep events in memory only); .bin writes raw EVENT_DTYPE records
+    capacity: events buffered between drains; older undrained events are dropped (and counted)
+    flush_every: seconds between drains by the writer thread (sooner once the buffer is half full)
+    console_every: print the latest event of every level at most this often (None: no console view)
+    Nothing is printed unless console_every is set.
+    """
+    def __init__(self, path=None, capacity=4096, flush_every=0.5, console_every=None, color_names=None,
+                 out=None):
+        self.path = path
+        self.binary = bool(path) and path.endswith(".bin")
+        self._buffer = np.zeros(capacity, dtype=EVENT_DTYPE)
+        self._head = 0              # events ever recorded
+        self._tail = 0              # events drained
+        self.dropped = 0
+        self.written = 0
+        self.flush_every = flush_every
+        self.console_every = console_every
+        self.color_names = color_names or {}
+        self.out = out or sys.stdout
+        self._latest = {}           # level → newest event, for the console view
+        self._notes = {}            # name → newest note text not printed yet
+        self._next_console = 0.0
+        self._start = time.perf_counter()
+        self._file = open(path, "wb" if self.binary else "w") if path else None
+        self._lock = Lock()
+        self._stop = Event()
+        self._wake = Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def record(self, kind, level, pct, color, status, blocked=False, sim_time=0.0):
+        with self._lock:
+            self._buffer[self._head % len(self._buffer)] = (
+                time.perf_counter() - self._start, sim_time, _KIND[kind], level, pct, color[:3],
+                _STATUS[status], blocked)
+            self._head += 1
+            if self._head - self._tail == len(self._buffer) // 2:
+                self._wake.set()
+
+    @property
+    def console_on(self):
+        return self.console_every is not None
+
+    def note(self, name, text):
+        """Text for the console view, printed (once) under its next line; a newer note of the same name replaces it."""
+        if self.console_on:
+            with self._lock:
+                self._notes[name] = text
+
+    def drain(self):
+        """Write out everything recorded since the last drain; returns the events written."""
+        with self._lock:
+            pending = self._head - self._tail
+            if pending > len(self._buffer):
+                self.dropped += pending - len(self._buffer)
+                self._tail = self._head - len(self._buffer)
+            index = np.arange(self._tail, self._head) % len(self._buffer)
+            events = self._buffer[index]
+            self._tail = self._head
+        if not len(events):
+            return events
+        if self._file is not None:
+            if self.binary:
+                self._file.write(events.tobytes())
+            else:
+                self._file.write("".join(json.dumps(event_dict(e)) + "\n" for e in events))
+            self._file.flush()
+        self.written += len(events)
+        for e in events:
+            self._latest[int(e["level"])] = e
+        return events
+
+    def console(self, force=False):
+        """One line with the newest event of every level, at most every console_every seconds."""
+        now = time.perf_counter()
+        if not self._latest or (not force and now < self._next_console):
+            return
+        self._next_console = now + (self.console_every or 0.0)
+        parts = []
+        for level in sorted(self._latest):
+            e = self._latest[level]
+            name = self.color_names.get(tuple(int(c) for c in e["color"]), "OFF")
+            blocked = " BLOCKED" if e["blocked"] else ""
+            parts.append(f"L{level + 1} {name} {e['pct']:.0f}% {STATUSES[e['status']]}{blocked}")
+        sim_time = max(float(e["sim_time"]) for e in self._latest.values())
+        with self._lock:
+            notes, self._notes = self._notes, {}
+        self.out.write(f"[{sim_time:.0f}s] " + " | ".join(parts) + f" ({self.written} events)\n")
+        for text in notes.values():
+            self.out.write(text if text.endswith("\n") else text + "\n")
+        self.out.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_every)
+            self._wake.clear()
+            self.drain()
+            if self.console_on:
+                self.console()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+        if self.console_on:
+            # the last line and notes, even if the rate limit would hold them back
+            self.console(force=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def event_dict(e):
+    return {
+        "t": round(float(e["time"]), 4),
+        "sim_t": float(e["sim_time"]),
+        "kind": KINDS[e["kind"]],
+        "level": int(e["level"]) + 1,
+        "pct": round(float(e["pct"]), 2),
+        "color": [int(c) for c in e["color"]],
+        "status": STATUSES[e["status"]],
+        "blocked": bool(e["blocked"]),
+    }
+
+def read_telemetry(path):
+    """Events of a log: a record array for .bin logs, a list of dicts for JSON lines."""
+    if path.endswith(".bin"):
+        return np.fromfile(path, dtype=EVENT_DTYPE)
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    events = read_telemetry(sys.argv[1])
+    if isinstance(events, np.ndarray):
+        events = [event_dict(e) for e in events]
+    print(f"{len(events)} events")
+    for kind in KINDS:
+        count = sum(e["kind"] == kind for e in events)
+        if count:
+            print(f"{kind}: {count}")
@@ -1,6 +1,14 @@
+import os
 import time
-import board
-import neopixel
+
+if os.environ.get("CPS_VIRTUAL"):
+    # headless run: frames go to a capture file instead of the strips (see virtual_strip.py)
+    from virtual_strip import board, neopixel
+else:
+    import board
+    import neopixel
+
+from water_sim import TerraceSimulator
 
 # 5 terraces (bottom → top)
 print("Initializing LED strips...")
@@ -34,12 +42,15 @@ water_capacities = [400, 300, 250, 200, 150]  # Level 1 to Level 5
 # Flow rates for each level in L/s (based on size - larger levels have higher flow rates)
 flow_rates = [4.0, 3.0, 2.5, 2.0, 1.5]  # Level 1 to Level 5 (L/s)
 
-# Current water levels in litres (start at 50% capacity)
-current_water_levels = [200.0, 150.0, 125.0, 100.0, 75.0]  # Level 1 to Level 5
+# Starting water levels in litres (start at 50% capacity)
+initial_water_levels = [200.0, 150.0, 125.0, 100.0, 75.0]  # Level 1 to Level 5
+
+# Water model state lives in the simulator; one scenario here
+sim = TerraceSimulator(water_capacities, flow_rates, initial_water_levels, WATER_SPRING_RATE)
 
 def get_color_for_level(level_index):
     """Get LED color based on water level percentage"""
-    water_percentage = (current_water_levels[level_index] / water_capacities[level_index]) * 100
+    water_percentage = (sim.levels[0, level_index] / water_capacities[level_index]) * 100
     
     if water_percentage < 50:
         return YELLOW
@@ -52,33 +63,11 @@ def get_color_for_level(level_index):
 
 def update_water_system():
     """Update water levels with realistic flow rates"""
-    global current_water_levels
-    
     # Time step (1 second per update cycle)
     time_step = 1.0
     
-    # Add water to Level 5 from water spring
-    water_input = WATER_SPRING_RATE * time_step
-    current_water_levels[4] += water_input
-    
-    # Water flows from higher levels to lower levels when overflowing
-    # Process from Level 5 down to Level 2
-    for i in range(4, 0, -1):  # Level 5 (index 4) down to Level 2 (index 1)
-        if current_water_levels[i] > water_capacities[i]:
-            # Calculate overflow
-            overflow = current_water_levels[i] - water_capacities[i]
-            
-            # Calculate actual transfer rate (limited by level's flow rate)
-            actual_transfer = min(overflow, flow_rates[i] * time_step)
-            
-            # Transfer water to next lower level
-            current_water_levels[i] -= actual_transfer
-            current_water_levels[i-1] += actual_transfer
-    
-    # Level 1 outflow (water disappears from system)
-    if current_water_levels[0] > 0:
-        outflow = min(current_water_levels[0], flow_rates[0] * time_step)
-        current_water_levels[0] -= outflow
+    # Spring input to Level 5, overflow cascade from Level 5 down to Level 2, Level 1 outflow
+    sim.step(time_step)
 
 def display_water_status():
     """Display current water status and flow rates for all levels"""
@@ -90,9 +79,9 @@ def display_water_status():
     
     for i in range(5):
         level_num = i + 1
-        water_pct = (current_water_levels[i] / water_capacities[i]) * 100
+        water_pct = (sim.levels[0, i] / water_capacities[i]) * 100
         capacity = water_capacities[i]
-        current = current_water_levels[i]
+        current = sim.levels[0, i]
         flow_rate = flow_rates[i]
         
         if water_pct < 50:
@@ -108,7 +97,7 @@ def display_water_status():
     
     # Calculate system throughput
     total_input = WATER_SPRING_RATE
-    total_output = min(current_water_levels[0], flow_rates[0]) if current_water_levels[0] > 0 else 0
+    total_output = min(sim.levels[0, 0], flow_rates[0]) if sim.levels[0, 0] > 0 else 0
     print("-"*60)
     print(f"System Input: {total_input} L/s | System Output: {total_output:.1f} L/s")
     print("="*60)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# virtual_strip.py
+# Headless stand-in for board / neopixel / adafruit_dht so the LED scripts run on any Linux box.
+# Every show() appends the frame, with a timestamp, to a memory-mapped capture file.
+# pigpio.py (PigpioMulti over fake_pigpio) writes its decoded frames to the same file.
+#
+# In a script:
+#     if os.environ.get("CPS_VIRTUAL"):
+#         from virtual_strip import board, neopixel
+#     else:
+#         import board
+#         import neopixel
+#
+# Environment:
+#   CPS_VIRTUAL=1          use this backend instead of the real strips
+#   CPS_CAPTURE=path       capture file (default: led_capture.bin)
+#   CPS_VIRTUAL_SLEEP=1    time.sleep() advances a virtual clock instead of waiting
+#   CPS_VIRTUAL_SECONDS=N  raise KeyboardInterrupt once N (virtual) seconds have passed,
+#                          so the scripts' Ctrl+C cleanup runs and they exit
+
+import atexit
+import math
+import mmap
+import os
+import random
+import time
+from threading import Lock, current_thread, main_thread
+from types import SimpleNamespace
+
+import numpy as np
+
+# -----------------------------
+# Capture file: 64-byte header followed by fixed-size records
+# -----------------------------
+MAGIC = b"CPSCAP01"
+HEADER_SIZE = 64
+DEFAULT_MAX_PIXELS = 300
+
+def record_dtype(max_pixels):
+    return np.dtype([
+        ("time", "<f8"),        # seconds since the capture started (virtual when sleeps are virtual)
+        ("strip", "<u2"),       # order in which the strip was created
+        ("pin", "<u2"),         # GPIO number
+        ("count", "<u2"),       # pixels on the strip; pixels past count are zero
+        ("brightness", "<f4"),
+        ("pixels", "u1", (max_pixels, 3)),  # r,g,b with brightness applied
+    ])
+
+HEADER = np.dtype([("magic", "S8"), ("max_pixels", "<u4"), ("record_size", "<u4"), ("records", "<u8")])
+
+class CaptureFile:
+    """
+    Append-only file of fixed-size frame records, written through a growing memory map.
+    Records hold max_pixels pixels; a longer strip widens every record (see reserve()).
+    """
+    def __init__(self, path, max_pixels=DEFAULT_MAX_PIXELS, capacity=1024):
+        self.path = path
+        self.max_pixels = max_pixels
+        self.dtype = record_dtype(max_pixels)
+        self.records = 0
+        self.lock = Lock()
+        self._file = open(path, "w+b")
+        self._capacity = 0
+        self._map = None
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        if self._map is not None:
+            # numpy views must go before the map can be closed
+            self._header = self._table = None
+            self._map.flush()
+            self._map.close()
+        self._file.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._header = np.ndarray((), dtype=HEADER, buffer=self._map)
+        self._header["magic"] = MAGIC
+        self._header["max_pixels"] = self.max_pixels
+        self._header["record_size"] = self.dtype.itemsize
+        self._header["records"] = self.records
+        self._table = np.ndarray((capacity,), dtype=self.dtype, buffer=self._map, offset=HEADER_SIZE)
+        self._capacity = capacity
+
+    def reserve(self, max_pixels):
+        """Make the records wide enough for a strip of max_pixels pixels."""
+        with self.lock:
+            if max_pixels > self.max_pixels:
+                self._widen(max_pixels)
+
+    def _widen(self, max_pixels):
+        # the records written so far are copied into the wider layout
+        written = self._table[:self.records].copy()
+        self.max_pixels = max_pixels
+        self.dtype = record_dtype(max_pixels)
+        self._grow(self._capacity)
+        table = self._table[:self.records]
+        for name in self.dtype.names:
+            if name != "pixels":
+                table[name] = written[name]
+        table["pixels"] = 0
+        table["pixels"][:, :written.dtype["pixels"].shape[0]] = written["pixels"]
+
+    def append(self, t, strip, pin, brightness, pixels):
+        with self.lock:
+            if len(pixels) > self.max_pixels:
+                # e.g. a PigpioMulti strip, whose length only shows in its first decoded frame
+                self._widen(len(pixels))
+            if self.records == self._capacity:
+                self._grow(self._capacity * 2)
+            rec = self._table[self.records]
+            rec["time"] = t
+            rec["strip"] = strip
+            rec["pin"] = pin
+            rec["count"] = len(pixels)
+            rec["brightness"] = brightness
+            rec["pixels"][:len(pixels)] = pixels
+            self.records += 1
+            # readers only trust records up to this count
+            self._header["records"] = self.records
+
+    def close(self):
+        with self.lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            self._header = self._table = None
+            self._map.close()
+            self._map = None
+            self._file.truncate(HEADER_SIZE + self.records * self.dtype.itemsize)
+            self._file.close()
+
+def read_capture(path):
+    """Memory-map a capture file read-only; returns a structured array with one row per shown frame."""
+    header = np.fromfile(path, dtype=HEADER, count=1)[0]
+    if header["magic"] != MAGIC:
+        raise ValueError(f"{path} is not an LED capture file")
+    dtype = record_dtype(int(header["max_pixels"]))
+    records = int(header["records"])
+    if records == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(records,))
+
+# -----------------------------
+# Clock: real time, or virtual time advanced by time.sleep()
+# -----------------------------
+class Clock:
+    def __init__(self, virtual=False, limit=None):
+        self.virtual = virtual
+        self.limit = limit
+        self.now = 0.0
+        self._start = time.perf_counter()
+        self._stopped = False
+
+    def time(self):
+        if self.virtual:
+            return self.now
+        return time.perf_counter() - self._start
+
+    def sleep(self, seconds):
+        if not self.virtual:
+            _real_sleep(seconds)
+        elif seconds > 0:
+            self.now += seconds
+        self.check()
+
+    def check(self):
+        """Raise KeyboardInterrupt once, the first time the run limit is reached (main thread only)."""
+        if current_thread() is not main_thread():
+            return
+        if self.limit is not None and not self._stopped and self.time() >= self.limit:
+            self._stopped = True
+            raise KeyboardInterrupt
+
+_real_sleep = time.sleep
+_limit = os.environ.get("CPS_VIRTUAL_SECONDS")
+clock = Clock(virtual=bool(os.environ.get("CPS_VIRTUAL_SLEEP")),
+              limit=float(_limit) if _limit else None)
+if clock.virtual or clock.limit is not None:
+    # every sleep checks the run limit, so loops that never show() a frame stop too
+    time.sleep = clock.sleep
+
+_capture = None
+
+def capture():
+    """The capture file shared by all virtual strips in this process (opened on first use)."""
+    global _capture
+    if _capture is None:
+        _capture = CaptureFile(os.environ.get("CPS_CAPTURE", "led_capture.bin"))
+        atexit.register(_capture.close)
+    return _capture
+
+# -----------------------------
+# board / neopixel stand-ins
+# -----------------------------
+class Pin:
+    def __init__(self, bcm):
+        self.id = bcm
+
+    def __repr__(self):
+        return f"board.D{self.id}"
+
+board = SimpleNamespace(**{f"D{n}": Pin(n) for n in range(28)})
+
+def _rgb(color):
+    if isinstance(color, (int, np.integer)):
+        return ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF)
+    return tuple(int(max(0, min(255, c))) for c in color[:3])
+
+class VirtualStrip:
+    """
+    Same interface as neopixel.NeoPixel (and StripProxy): pixels[i] / pixels[a:b] assignment,
+    fill(), show(), brightness, auto_write. show() records the frame instead of driving LEDs.
+    """
+    _created = 0
+
+    def __init__(self, pin, n, *, bpp=3, brightness=1.0, auto_write=True, pixel_order=None):
+        self.pin = pin
+        self.n = n
+        self.length = n
+        self.auto_write = auto_write
+        self._brightness = min(max(brightness, 0.0), 1.0)
+        self._pixels = np.zeros((n, 3), dtype=np.uint8)
+        self.index = VirtualStrip._created
+        VirtualStrip._created += 1
+        capture().reserve(n)
+
+    def __len__(self):
+        return self.n
+
+    def __setitem__(self, key, color):
+        # key: index, slice or index array; color: one color (broadcast) or one per selected pixel
+        if (isinstance(key, (int, np.integer)) or isinstance(color, (int, np.integer))
+                or np.ndim(color) == 1 and len(color) in (3, 4)):
+            self._pixels[key] = _rgb(color)
+        else:
+            self._pixels[key] = [_rgb(c) for c in color]
+        if self.auto_write:
+            self.show()
+
+    def __getitem__(self, key):
+        selected = self._pixels[key]
+        if selected.ndim == 1:
+            return tuple(selected.tolist())
+        return [tuple(c) for c in selected.tolist()]
+
+    @property
+    def brightness(self):
+        return self._brightness
+
+    @brightness.setter
+    def brightness(self, value):
+        self._brightness = min(max(value, 0.0), 1.0)
+        if self.auto_write:
+            self.show()
+
+    def fill(self, color):
+        self._pixels[:] = _rgb(color)
+        if self.auto_write:
+            self.show()
+
+    def show(self):
+        scaled = (self._pixels * self._brightness).astype(np.uint8)
+        capture().append(clock.time(), self.index, self.pin.id, self._brightness, scaled)
+        clock.check()
+
+    def deinit(self):
+        pass
+
+neopixel = SimpleNamespace(NeoPixel=VirtualStrip, RGB="RGB", GRB="GRB", RGBW="RGBW", GRBW="GRBW")
+
+# -----------------------------
+# adafruit_dht stand-in: slowly drifting readings that sometimes fail, like a real DHT22
+# -----------------------------
+class SimulatedDHT:
+    READ_SECONDS = 0.25  # a real read blocks for a few hundred ms
+    ERROR_RATE = 0.1
+
+    def __init__(self, pin, use_pulseio=True):
+        self.pin = pin
+        self._rng = random.Random(pin.id)
+
+    def _read(self):
+        time.sleep(self.READ_SECONDS)
+        if self._rng.random() < self.ERROR_RATE:
+            raise RuntimeError("Checksum did not validate. Try again.")
+
+    @property
+    def temperature(self):
+        self._read()
+        return 24.0 + 4.0 * math.sin(clock.time() / 600.0) + self._rng.uniform(-0.2, 0.2)
+
+    @property
+    def humidity(self):
+        self._read()
+        return 62.0 + 25.0 * math.sin(clock.time() / 300.0) + self._rng.uniform(-0.5, 0.5)
+
+    def exit(self):
+        pass
+
+adafruit_dht = SimpleNamespace(DHT22=SimulatedDHT, DHT11=SimulatedDHT)
+
+if __name__ == "__main__":
+    # Summarise a capture: python3 virtual_strip.py [led_capture.bin]
+    import sys
+    frames = read_capture(sys.argv[1] if len(sys.argv) > 1 else "led_capture.bin")
+    print(f"{len(frames)} frames")
+    if len(frames):
+        span = float(frames["time"][-1] - frames["time"][0])
+        print(f"{span:.2f} s from first to last frame")
+        for strip in np.unique(frames["strip"]):
+            mine = frames[frames["strip"] == strip]
+            print(f"strip {strip} (GPIO {mine['pin'][0]}): {len(mine)} frames")